@@ -1,109 +1,480 @@
-from flask import Flask, request, render_template_string, redirect, url_for, flash
-import requests, smtplib, os, json
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from flask import Flask, Response, request, render_template, redirect, url_for, flash, jsonify, abort, session, send_file, stream_with_context
+import os, json, time, uuid, hashlib, hmac, secrets, sqlite3, itertools
+import click, jinja2, requests
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout, wait
 from dotenv import load_dotenv
+from werkzeug.exceptions import BadGateway, NotFound
+from cache import MISS, LRUCache, ResponseCache, SingleFlight
+from http_client import UpstreamClient
+from ratelimit import DailyQuota, UpstreamScheduler, current_priority, priority, with_priority
+from mailer import SMTPTransport, build_message
+from jobs import JobQueue
+from bulk import BulkLedger, RunInProgress, run_bulk
+from catalog import TOKEN, MovieCatalog
+from prefetch import Prefetcher
+from images import VARIANTS, PosterCache
+from metrics import Registry, RequestTimings, bind, current_timings, timed, timer, with_timings
 
 load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY")
 
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
-SMTP_SERVER = 'smtp.gmail.com'
-SMTP_PORT = 587
+OMDB_API_KEY = os.getenv("OMDB_API_KEY")
+# Overridable so the app can be pointed at local stubs (see bench.py).
+TMDB_BASE_URL = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+OMDB_BASE_URL = os.getenv("OMDB_BASE_URL", "http://www.omdbapi.com")
+TMDB_IMAGE_BASE_URL = os.getenv("TMDB_IMAGE_BASE_URL", "https://image.tmdb.org/t/p")
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"
+SMTP_MAX_PER_MINUTE = float(os.getenv("SMTP_MAX_PER_MINUTE", "0"))
 EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 BLOGGER_EMAIL = os.getenv("BLOGGER_EMAIL")
+MOVIE_BUNDLE_PARTS = "credits,videos,keywords,watch/providers"
+POST_CONFIG_FLAGS = [
+    "include_overview", "include_directors", "include_cast", "include_genres", "include_release_date",
+    "include_runtime", "include_budget", "include_revenue", "include_tmdb_rating", "include_imdb", "include_trailer",
+]
 
+# Seconds. The genre list barely changes; the bundle carries watch providers,
+# which change far more often than credits or keywords.
+CACHE_TTLS = {
+    "genres": 12 * 3600,
+    "movie_bundle": 3600,
+    "imdb_rating": 24 * 3600,
+}
+metrics = Registry(prefix="filmbot_")
+call_seconds = metrics.histogram("call_seconds", "Latency of upstream-backed calls; cache hits never reach them.", ("call",))
+call_errors = metrics.counter("call_errors_total", "Upstream-backed calls that raised.", ("call",))
+render_seconds = metrics.histogram("render_seconds", "Template render time.", ("template",))
+request_seconds = metrics.histogram("request_seconds", "Time to the response headers, per endpoint.", ("endpoint",))
+requests_total = metrics.counter("requests_total", "Responses by endpoint and status code.", ("endpoint", "status"))
+upstream_scheduler = UpstreamScheduler()
+upstream_scheduler.add_bucket("tmdb", rate=float(os.getenv("TMDB_RATE_PER_SECOND", "35")), burst=int(os.getenv("TMDB_BURST", "20")))
+upstream_scheduler.add_bucket("omdb", rate=float(os.getenv("OMDB_RATE_PER_SECOND", "5")), burst=int(os.getenv("OMDB_BURST", "5")))
+omdb_quota = DailyQuota(os.getenv("QUOTA_DB_PATH", "quota.db"), "omdb", limit=int(os.getenv("OMDB_DAILY_LIMIT", "1000")),
+                        reserve=int(os.getenv("OMDB_DAILY_RESERVE", "100")))
+tmdb = UpstreamClient("tmdb", TMDB_BASE_URL, {"api_key": TMDB_API_KEY}, connect_timeout=3.05, read_timeout=10,
+                      scheduler=upstream_scheduler, metrics=metrics)
+omdb = UpstreamClient("omdb", OMDB_BASE_URL, {"apikey": OMDB_API_KEY}, connect_timeout=3.05, read_timeout=5,
+                      scheduler=upstream_scheduler, metrics=metrics)
+# Image CDN: no API key and no token bucket, the API rate limits do not apply to it.
+tmdb_images = UpstreamClient("tmdb_images", TMDB_IMAGE_BASE_URL, connect_timeout=3.05, read_timeout=15,
+                             metrics=metrics)
+poster_cache = PosterCache(os.getenv("POSTER_CACHE_DIR", "poster_cache"), tmdb_images,
+                           max_bytes=int(os.getenv("POSTER_CACHE_MAX_MB", "512")) * 1024 * 1024)
+POSTER_MAX_AGE = 365 * 24 * 3600
+mail_transport = SMTPTransport(SMTP_SERVER, SMTP_PORT, EMAIL_ADDRESS, EMAIL_PASSWORD, starttls=SMTP_STARTTLS,
+                               max_per_minute=SMTP_MAX_PER_MINUTE or None, metrics=metrics)
+upstream_pool = ThreadPoolExecutor(max_workers=int(os.getenv("UPSTREAM_WORKERS", "8")), thread_name_prefix="upstream")
+POST_DEADLINE = float(os.getenv("POST_DEADLINE", "15"))
+DISCOVER_MAX_PAGES = int(os.getenv("DISCOVER_MAX_PAGES", "25"))
+DISCOVER_CONCURRENCY = int(os.getenv("DISCOVER_CONCURRENCY", "4"))
+TMDB_MAX_DISCOVER_PAGE = 500
+post_render_cache = LRUCache(maxsize=int(os.getenv("RENDER_CACHE_MAX_ENTRIES", "512")))
+RENDER_CACHE_TTL = 24 * 3600
+response_cache = ResponseCache(maxsize=int(os.getenv("CACHE_MAX_ENTRIES", "2048")), db_path=os.getenv("CACHE_DB_PATH"))
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+job_queue = JobQueue(JOBS_DB_PATH, max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "5")))
+job_queue.register("post", lambda payload: {"subject": publish_post(payload["movie_id"], payload["config"], payload["custom_embed"])})
+job_queue.register("bulk", lambda payload: run_bulk_post(payload["run_id"], bulk_movie_ids(payload), payload["config"],
+                                                         payload.get("custom_embed", "")).as_dict())
+bulk_ledger = BulkLedger(JOBS_DB_PATH)
+movie_catalog = MovieCatalog(os.getenv("CATALOG_DB_PATH", "catalog.db"))
+prefetcher = Prefetcher(with_priority(lambda movie_id: get_movie_bundle(movie_id), "prefetch"), is_warm=lambda movie_id: get_movie_bundle.is_cached(movie_id),
+                        max_queue=int(os.getenv("PREFETCH_QUEUE_SIZE", "32")),
+                        max_per_second=float(os.getenv("PREFETCH_MAX_PER_SECOND", "4")) or None)
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "3"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_POOL = 50
+AUTOCOMPLETE_MIN_LENGTH = 2
+SEARCH_CACHE_TTL = 3600
+search_prefix_cache = LRUCache(maxsize=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "4096")))
+search_flight = SingleFlight()
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+@app.before_request
+def start_background_workers():
+    job_queue.start(JOB_WORKERS)
+    prefetcher.start(PREFETCH_WORKERS)
+
+@app.before_request
+def start_request_timing():
+    bind(RequestTimings())
+
+@app.after_request
+def add_server_timing(response):
+    timings = current_timings()
+    if timings is None:
+        return response
+    # Unmatched URLs share one label so scanners cannot blow up the series count.
+    endpoint = request.endpoint or "unmatched"
+    request_seconds.observe(time.perf_counter() - timings.started, endpoint)
+    requests_total.inc(endpoint, str(response.status_code))
+    response.headers["Server-Timing"] = timings.server_timing()
+    return response
+
+@app.teardown_request
+def stop_request_timing(exc):
+    bind(None)
+
+@app.errorhandler(requests.RequestException)
+def upstream_error(e):
+    # TMDB's 404 means the id does not exist, so it is ours too; any other
+    # upstream failure is a bad gateway rather than a crash.
+    app.logger.warning("%s: servis hatası: %s", request.path, e)
+    if getattr(e.response, "status_code", None) == 404:
+        return NotFound()
+    return BadGateway()
+
+def render_page(name, template, **context):
+    with timer(render_seconds, name):
+        return render_template(template, **context)
+
+@timed(call_seconds, errors=call_errors)
 def search_movies(query, language='tr-TR'):
-    url = f"https://api.themoviedb.org/3/search/movie?api_key={TMDB_API_KEY}&query={query}&language={language}"
-    return requests.get(url).json().get('results', [])[:10]
+    return tmdb.get_json("/search/movie", query=query, language=language).get('results', [])[:10]
 
+@timed(call_seconds, errors=call_errors)
 def advanced_search_movies(query, year=None, genre_id=None, language='tr-TR'):
-    url = f"https://api.themoviedb.org/3/discover/movie?api_key={TMDB_API_KEY}&language={language}"
-    params = {}
-    if query:
-        params['query'] = query
-    if year:
-        params['primary_release_year'] = year
-    if genre_id:
-        params['with_genres'] = genre_id
-    return requests.get(url, params=params).json().get('results', [])[:10]
+    # /discover ignores `query`, so title searches go through /search/movie
+    # with the year filter and the genre is checked locally.
+    if not query:
+        return list(itertools.islice(discover_movies(year, genre_id, max_pages=1, language=language), 10))
+    results = tmdb.get_json("/search/movie", query=query, primary_release_year=year, language=language).get('results', [])
+    if genre_id and str(genre_id).isdigit():
+        results = [movie for movie in results if int(genre_id) in movie.get('genre_ids', [])]
+    return results[:10]
 
-def get_genres(language='tr-TR'):
-    url = f"https://api.themoviedb.org/3/genre/movie/list?api_key={TMDB_API_KEY}&language={language}"
-    return requests.get(url).json().get('genres', [])
+@timed(call_seconds, errors=call_errors)
+def discover_page(page, year=None, genre_id=None, language='tr-TR'):
+    return tmdb.get_json("/discover/movie", language=language, page=page, primary_release_year=year, with_genres=genre_id)
 
-def get_movie_details(movie_id, language='tr-TR'):
-    url = f"https://api.themoviedb.org/3/movie/{movie_id}?api_key={TMDB_API_KEY}&language={language}"
-    return requests.get(url).json()
+def discover_movies(year=None, genre_id=None, max_pages=1, language='tr-TR', concurrency=DISCOVER_CONCURRENCY, on_error=None):
+    # Page 1 is fetched here, before anything is streamed, so a TMDB failure
+    # can still become an error status instead of a truncated 200. It also
+    # tells us total_pages; the rest are fetched lazily by the generator.
+    fetch = with_timings(with_priority(discover_page))
+    first = fetch(1, year, genre_id, language)
+    last_page = min(max_pages, first.get('total_pages', 1), TMDB_MAX_DISCOVER_PAGE)
+    return discover_rest(fetch, first, last_page, year, genre_id, language, concurrency, on_error)
 
-def get_movie_credits(movie_id):
-    url = f"https://api.themoviedb.org/3/movie/{movie_id}/credits?api_key={TMDB_API_KEY}&language=tr-TR"
-    return requests.get(url).json()
+def discover_rest(fetch, first, last_page, year, genre_id, language, concurrency, on_error=None):
+    # Pages 2..N run with at most `concurrency` requests in flight and are
+    # yielded in arrival order. Only the ids seen so far are kept, so memory
+    # stays flat however many pages run. The response is already streaming,
+    # so a page that fails is skipped and reported to on_error(page, error).
+    seen = set()
+    def fresh(results):
+        for movie in results:
+            if movie['id'] not in seen:
+                seen.add(movie['id'])
+                yield movie
+    yield from fresh(first.get('results', []))
+    pages = iter(range(2, last_page + 1))
+    in_flight = {upstream_pool.submit(fetch, page, year, genre_id, language): page for page in itertools.islice(pages, concurrency)}
+    try:
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                page = in_flight.pop(future)
+                try:
+                    results = future.result().get('results', [])
+                except requests.RequestException as e:
+                    app.logger.warning("Keşif sayfası %s alınamadı, atlanıyor: %s", page, e)
+                    if on_error is not None:
+                        on_error(page, e)
+                    results = []
+                yield from fresh(results)
+                for page in itertools.islice(pages, 1):
+                    in_flight[upstream_pool.submit(fetch, page, year, genre_id, language)] = page
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+def search_catalog(query, year=None, genre_id=None, limit=10):
+    if (year and not str(year).isdigit()) or (genre_id and not str(genre_id).isdigit()):
+        return []
+    try:
+        return movie_catalog.search(query, year or None, genre_id or None, limit=limit)
+    except sqlite3.Error as e:
+        app.logger.warning("Yerel katalog araması başarısız: %s", e)
+        return []
 
-def get_movie_videos(movie_id, language='tr-TR'):
-    url = f"https://api.themoviedb.org/3/movie/{movie_id}/videos?api_key={TMDB_API_KEY}&language={language}"
-    videos = requests.get(url).json().get('results', [])
+def remember_movies(movies):
+    try:
+        movie_catalog.upsert_movies(movies)
+    except sqlite3.Error as e:
+        app.logger.warning("Yerel katalog güncellenemedi: %s", e)
+
+def prefetch_owner():
+    if not app.secret_key:
+        return request.remote_addr
+    return session.setdefault("prefetch_owner", uuid.uuid4().hex)
+
+def prefetch_movies(movies, owner):
+    # The next click is almost always one of the top results; warm their
+    # bundles so /movie/<id> and /config/<id> are served from cache.
+    prefetcher.schedule(owner, [movie["id"] for movie in movies[:PREFETCH_TOP_N]])
+
+def prefetching(movies, owner):
+    top = []
+    for movie in movies:
+        if len(top) < PREFETCH_TOP_N:
+            top.append(movie)
+            if len(top) == PREFETCH_TOP_N:
+                prefetch_movies(top, owner)
+        yield movie
+    if len(top) < PREFETCH_TOP_N:
+        prefetch_movies(top, owner)
+
+def normalize_query(query):
+    return " ".join(TOKEN.findall((query or "").casefold()))
+
+def title_matches(movie, tokens):
+    words = TOKEN.findall(f"{movie.get('title') or ''} {movie.get('original_title') or ''}".casefold())
+    return all(any(word.startswith(token) for word in words) for token in tokens)
+
+def lookup_titles(query):
+    # Keep a wider pool than we return so longer prefixes can be narrowed
+    # locally; "complete" means the pool holds every match for this prefix.
+    results = search_catalog(query, limit=AUTOCOMPLETE_POOL + 1)
+    if results:
+        entry = (results[:AUTOCOMPLETE_POOL], len(results) <= AUTOCOMPLETE_POOL, "catalog")
+    else:
+        data = tmdb.get_json("/search/movie", query=query, language='tr-TR')
+        results = data.get('results', [])
+        remember_movies(results)
+        entry = (results, data.get('total_results', 0) <= len(results), "tmdb")
+    search_prefix_cache.set(query, entry, SEARCH_CACHE_TTL)
+    return entry
+
+def autocomplete(query):
+    key = normalize_query(query)
+    entry = search_prefix_cache.get(key)
+    if entry is not MISS:
+        return entry[0], "cache"
+    tokens = key.split()
+    for end in range(len(key) - 1, AUTOCOMPLETE_MIN_LENGTH - 1, -1):
+        entry = search_prefix_cache.get(key[:end])
+        if entry is not MISS and entry[1]:
+            results = [movie for movie in entry[0] if title_matches(movie, tokens)]
+            search_prefix_cache.set(key, (results, True, "narrowed"), SEARCH_CACHE_TTL)
+            return results, "narrowed"
+    results, _, source = search_flight.do(key, lambda: lookup_titles(key))
+    return results, source
+
+@response_cache.cached("genres", CACHE_TTLS["genres"])
+@timed(call_seconds, errors=call_errors)
+def get_genres(language='tr-TR'):
+    return tmdb.get_json("/genre/movie/list", language=language).get('genres', [])
+
+def find_trailer(videos):
     for video in videos:
         if video.get('type') == 'Trailer' and video.get('site') == 'YouTube':
             return f"https://www.youtube.com/embed/{video.get('key')}"
     return None
 
-def get_watch_providers(movie_id):
-    url = f"https://api.themoviedb.org/3/movie/{movie_id}/watch/providers?api_key={TMDB_API_KEY}"
-    return requests.get(url).json().get('results', {}).get('TR', {})
-
-def get_movie_keywords(movie_id):
-    url = f"https://api.themoviedb.org/3/movie/{movie_id}/keywords?api_key={TMDB_API_KEY}"
-    return requests.get(url).json().get('keywords', [])
+@response_cache.cached("movie_bundle", CACHE_TTLS["movie_bundle"])
+@timed(call_seconds, errors=call_errors)
+def get_movie_bundle(movie_id, language='tr-TR'):
+    movie = tmdb.get_json(f"/movie/{movie_id}", language=language, append_to_response=MOVIE_BUNDLE_PARTS)
+    fingerprint = hashlib.sha1(json.dumps(movie, sort_keys=True).encode()).hexdigest()
+    return {
+        "fingerprint": fingerprint,
+        "movie": movie,
+        "credits": movie.pop('credits', {}),
+        "trailer_url": find_trailer(movie.pop('videos', {}).get('results', [])),
+        "keywords": movie.pop('keywords', {}).get('keywords', []),
+        "watch_providers": movie.pop('watch/providers', {}).get('results', {}).get('TR', {}),
+    }
 
+@response_cache.cached("imdb_rating", CACHE_TTLS["imdb_rating"])
+@timed(call_seconds, errors=call_errors)
 def get_imdb_rating(imdb_id):
-    omdb_api_key = os.getenv("OMDB_API_KEY")
-    if not omdb_api_key:
+    if not OMDB_API_KEY:
         return None
-    url = f"http://www.omdbapi.com/?apikey={omdb_api_key}&i={imdb_id}"
-    return requests.get(url).json().get("imdbRating")
+    # Returning None (which is never cached) defers the lookup to a later
+    # post instead of spending the last of the day's budget on batch work.
+    if not omdb_quota.try_consume(current_priority()):
+        app.logger.warning("OMDb günlük kotası azaldı, IMDb puanı atlandı (%s)", imdb_id)
+        return None
+    data = omdb.get_json("/", i=imdb_id)
+    if data.get("Response") == "False":
+        if "limit" in data.get("Error", "").lower():
+            omdb_quota.exhaust()
+            return None
+        # Unknown id or no entry: cache OMDb's own "no rating" value, or every
+        # later post of this movie spends another unit of the daily quota.
+        return "N/A"
+    return data.get("imdbRating")
+
+def fetch_post_data(movie_id, language='tr-TR'):
+    # OMDb only needs the imdb_id, so it is chained onto the TMDB future
+    # instead of waiting for the caller to come back for it.
+    bundle_future = upstream_pool.submit(with_timings(with_priority(get_movie_bundle)), movie_id, language)
+    rating_future = Future()
+    fetch_rating = with_timings(with_priority(get_imdb_rating))
+    def settle(future):
+        try:
+            rating_future.set_result(future.result())
+        except Exception as e:
+            app.logger.warning("IMDb puanı alınamadı (%s): %s", movie_id, e)
+            rating_future.set_result(None)
+    def enrich(future):
+        imdb_id = None if future.exception() else future.result()["movie"].get("imdb_id")
+        if not imdb_id:
+            rating_future.set_result(None)
+            return
+        try:
+            upstream_pool.submit(fetch_rating, imdb_id).add_done_callback(settle)
+        except RuntimeError:  # pool shut down at interpreter exit
+            rating_future.set_result(None)
+    bundle_future.add_done_callback(enrich)
+    return bundle_future, rating_future
 
+def gather_post_data(movie_id, language='tr-TR', timeout=POST_DEADLINE):
+    deadline = time.monotonic() + timeout
+    bundle_future, rating_future = fetch_post_data(movie_id, language)
+    bundle = bundle_future.result(timeout=timeout)
+    try:
+        imdb_rating = rating_future.result(timeout=max(0, deadline - time.monotonic()))
+    except FuturesTimeout:
+        app.logger.warning("IMDb puanı süre sınırını aştı (%s)", movie_id)
+        imdb_rating = None
+    return dict(bundle, imdb_rating=imdb_rating, language=language)
+
+def build_post_message(subject, html_content):
+    return build_message(EMAIL_ADDRESS, BLOGGER_EMAIL, subject, html_content)
+
+@timed(call_seconds, errors=call_errors)
 def send_email(subject, html_content):
-    msg = MIMEMultipart('alternative')
-    msg['Subject'] = subject
-    msg['From'] = EMAIL_ADDRESS
-    msg['To'] = BLOGGER_EMAIL
-    msg.attach(MIMEText(html_content, 'html'))
-    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-    server.starttls()
-    server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-    server.sendmail(EMAIL_ADDRESS, BLOGGER_EMAIL, msg.as_string())
-    server.quit()
-
-def create_email_html(movie_details, trailer_url, credits, keywords, config, custom_embed):
+    mail_transport.send(build_post_message(subject, html_content))
+
+@timed(call_seconds, errors=call_errors)
+def send_emails(posts):
+    return mail_transport.send_batch([build_post_message(subject, html_content) for subject, html_content in posts])
+
+def parse_post_config(form):
+    return {flag: form.get(flag) == "on" for flag in POST_CONFIG_FLAGS}
+
+def render_post(data, config, custom_embed):
+    movie = data["movie"]
+    key = (movie.get("id"), data.get("language"),
+           hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest(),
+           hashlib.sha1(custom_embed.encode()).hexdigest())
+    # A changed TMDB payload or IMDb rating invalidates the entry.
+    version = (data.get("fingerprint"), data["imdb_rating"])
+    cached = post_render_cache.get(key)
+    if cached is not MISS and cached[0] == version:
+        return cached[1]
+    html_content = create_email_html(movie, data["trailer_url"], data["credits"], data["keywords"], config, custom_embed, data["imdb_rating"])
+    post = (f"{movie.get('title', 'Film Detayları')} film izle", html_content)
+    post_render_cache.set(key, (version, post), RENDER_CACHE_TTL)
+    return post
+
+def publish_post(movie_id, config, custom_embed):
+    subject, html_content = render_post(gather_post_data(movie_id), config, custom_embed)
+    send_email(subject, html_content)
+    return subject
+
+def run_bulk_post(run_id, movie_ids, config, custom_embed="", **options):
+    return run_bulk(run_id, movie_ids,
+                    fetch=with_priority(gather_post_data, "batch"),
+                    render=lambda movie_id, data: render_post(data, config, custom_embed),
+                    send_batch=send_emails,
+                    ledger=bulk_ledger, **options)
+
+# Post HTML goes to Blogger verbatim (custom_embed is raw markup), so this
+# environment does not autoescape, matching the f-string it replaced.
+email_env = jinja2.Environment(autoescape=False, trim_blocks=True, lstrip_blocks=True)
+EMAIL_TEMPLATE = email_env.from_string("""<!doctype html>
+    <html lang="tr">
+      <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
+        <title>{{ title }}</title>
+        <meta name="description" content="{{ meta_description }}">
+        <meta name="keywords" content="{{ meta_keywords }}">
+        <meta property="og:title" content="{{ title }}">
+        <meta property="og:description" content="{{ meta_description }}">
+        <meta property="og:image" content="https://image.tmdb.org/t/p/w500{{ poster_path or '' }}">
+        <meta property="og:type" content="article">
+        <script type="application/ld+json">
+          {{ json_ld }}
+        </script>
+        <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css">
+      </head>
+      <body>
+        <div class="container my-5 text-center">
+          {% if poster_path %}
+          <img src="https://image.tmdb.org/t/p/w500{{ poster_path }}" alt="{{ title }} Poster" style="width:300px; height:450px; object-fit: cover; display: block; margin: auto;">
+          {% else %}
+          <p>Poster bulunamadı.</p>
+          {% endif %}
+          {% if config.include_overview %}
+          <p style="margin-bottom:1em;"><strong>Açıklama:</strong> {{ overview }}</p>
+          {% endif %}
+          {% if config.include_directors %}
+          <p style="margin-bottom:1em;"><strong>Yönetmen:</strong> {{ directors|join(", ") or "Bilinmiyor" }}</p>
+          {% endif %}
+          {% if config.include_cast %}
+          <p style="margin-bottom:1em;"><strong>Oyuncular:</strong> {{ cast|join(", ") or "Bilinmiyor" }}</p>
+          {% endif %}
+          {% if config.include_genres %}
+          <p style="margin-bottom:1em;"><strong>Film Kategorisi (Türler):</strong> {{ genres }}</p>
+          {% endif %}
+          {% if config.include_release_date %}
+          <p style="margin-bottom:1em;"><strong>Çıkış Tarihi:</strong> {{ release_date }}</p>
+          {% endif %}
+          {% if config.include_runtime %}
+          <p style="margin-bottom:1em;"><strong>Film Süresi:</strong> {{ runtime }} dakika</p>
+          {% endif %}
+          {% if config.include_budget %}
+          <p style="margin-bottom:1em;"><strong>Bütçe:</strong> {{ budget }} USD</p>
+          {% endif %}
+          {% if config.include_revenue %}
+          <p style="margin-bottom:1em;"><strong>Hasılat:</strong> {{ revenue }} USD</p>
+          {% endif %}
+          {% if config.include_tmdb_rating %}
+          <p style="margin-bottom:1em;"><strong>TMDB Puanı:</strong> {{ vote_average }} (Oy Sayısı: {{ vote_count }})</p>
+          {% endif %}
+          {% if config.include_imdb %}
+          <p style="margin-bottom:1em;"><strong>IMDb:</strong> {{ imdb_rating }} (<a href="{{ imdb_link }}" target="_blank">IMDb Sayfası</a>)</p>
+          {% endif %}
+          {% if trailer_url and config.get("include_trailer", True) %}
+          <h2 class="mt-4">Fragman</h2>
+          <div class="embed-responsive embed-responsive-16by9 mb-3" style="margin: auto;">
+            <iframe class="embed-responsive-item" src="{{ trailer_url }}" allowfullscreen></iframe>
+          </div>
+          {% endif %}
+          {% if custom_embed.strip() %}
+          <h2 class="mt-4">Ek Video</h2>
+          <div class="embed-responsive embed-responsive-16by9 mb-3" style="margin: auto;">{{ custom_embed }}</div>
+          {% endif %}
+          <p style="margin-top:2em; font-size:0.9em;">Labels: {{ tags_str }}</p>
+        </div>
+      </body>
+    </html>""")
+
+@timed(render_seconds)
+def create_email_html(movie_details, trailer_url, credits, keywords, config, custom_embed, imdb_rating=None):
     title = movie_details.get('title', 'Film Detayları')
     release_date = movie_details.get('release_date', 'Bilinmiyor')
     overview = movie_details.get('overview', 'Açıklama bulunamadı.')
     poster_path = movie_details.get('poster_path')
-    poster_img = (f'<img src="https://image.tmdb.org/t/p/w500{poster_path}" alt="{title} Poster" style="width:300px; height:450px; object-fit: cover; display: block; margin: auto;">'
-                 ) if poster_path else '<p>Poster bulunamadı.</p>'
     genres = ", ".join([g.get('name') for g in movie_details.get('genres', [])]) or "Bilinmiyor"
     vote_average = movie_details.get('vote_average', 'Bilinmiyor')
     vote_count = movie_details.get('vote_count', 'Bilinmiyor')
-    runtime = movie_details.get('runtime', 'Bilinmiyor')
-    budget = movie_details.get('budget', 'Bilinmiyor')
-    revenue = movie_details.get('revenue', 'Bilinmiyor')
     directors = [m['name'] for m in credits.get('crew', []) if m.get('job') == 'Director']
     cast = [m['name'] for m in credits.get('cast', [])][:5]
-    keyword_list = get_movie_keywords(movie_details.get("id", 0))
-    tags = [k['name'] for k in keyword_list]
+    tags = [k['name'] for k in keywords]
     tags_str = ", ".join(tags) if tags else "Bilinmiyor"
     imdb_id = movie_details.get("imdb_id")
-    if imdb_id:
-        imdb_rating = get_imdb_rating(imdb_id) or "Bilinmiyor"
-        imdb_link = f"https://www.imdb.com/title/{imdb_id}/"
-    else:
-        imdb_rating = "Bilinmiyor"
-        imdb_link = "#"
-    meta_description = overview if len(overview) < 160 else overview[:157] + "..."
-    meta_keywords = f"{title}, {genres}, {tags_str}"
     json_ld = {
       "@context": "https://schema.org",
       "@type": "Movie",
@@ -115,294 +486,555 @@ def create_email_html(movie_details, trailer_url, credits, keywords, config, cus
       "director": [{"@type": "Person", "name": d} for d in directors],
       "actor": [{"@type": "Person", "name": a} for a in cast]
     }
-    trailer_section = ""
-    if trailer_url and config.get("include_trailer", True):
-        trailer_section = (
-            '<h2 class="mt-4">Fragman</h2>'
-            '<div class="embed-responsive embed-responsive-16by9 mb-3" style="margin: auto;">'
-            f'<iframe class="embed-responsive-item" src="{trailer_url}" allowfullscreen></iframe>'
-            '</div>'
-        )
-    custom_video_section = ""
-    if custom_embed.strip():
-        custom_video_section = (
-            '<h2 class="mt-4">Ek Video</h2>'
-            '<div class="embed-responsive embed-responsive-16by9 mb-3" style="margin: auto;">'
-            f'{custom_embed}'
-            '</div>'
-        )
-    content = poster_img
-    if config.get("include_overview"): content += f'<p style="margin-bottom:1em;"><strong>Açıklama:</strong> {overview}</p>'
-    if config.get("include_directors"): content += f'<p style="margin-bottom:1em;"><strong>Yönetmen:</strong> {", ".join(directors) or "Bilinmiyor"}</p>'
-    if config.get("include_cast"): content += f'<p style="margin-bottom:1em;"><strong>Oyuncular:</strong> {", ".join(cast) or "Bilinmiyor"}</p>'
-    if config.get("include_genres"): content += f'<p style="margin-bottom:1em;"><strong>Film Kategorisi (Türler):</strong> {genres}</p>'
-    if config.get("include_release_date"): content += f'<p style="margin-bottom:1em;"><strong>Çıkış Tarihi:</strong> {release_date}</p>'
-    if config.get("include_runtime"): content += f'<p style="margin-bottom:1em;"><strong>Film Süresi:</strong> {runtime} dakika</p>'
-    if config.get("include_budget"): content += f'<p style="margin-bottom:1em;"><strong>Bütçe:</strong> {budget} USD</p>'
-    if config.get("include_revenue"): content += f'<p style="margin-bottom:1em;"><strong>Hasılat:</strong> {revenue} USD</p>'
-    if config.get("include_tmdb_rating"): content += f'<p style="margin-bottom:1em;"><strong>TMDB Puanı:</strong> {vote_average} (Oy Sayısı: {vote_count})</p>'
-    if config.get("include_imdb"): content += f'<p style="margin-bottom:1em;"><strong>IMDb:</strong> {imdb_rating} (<a href="{imdb_link}" target="_blank">IMDb Sayfası</a>)</p>'
-    content += trailer_section + custom_video_section
-    content += f'<p style="margin-top:2em; font-size:0.9em;">Labels: {tags_str}</p>'
-    
-    html = f"""<!doctype html>
-    <html lang="tr">
-      <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
-        <title>{title}</title>
-        <meta name="description" content="{meta_description}">
-        <meta name="keywords" content="{meta_keywords}">
-        <meta property="og:title" content="{title}">
-        <meta property="og:description" content="{meta_description}">
-        <meta property="og:image" content="https://image.tmdb.org/t/p/w500{poster_path if poster_path else ''}">
-        <meta property="og:type" content="article">
-        <script type="application/ld+json">
-          {json.dumps(json_ld, ensure_ascii=False, indent=2)}
-        </script>
-        <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css">
-      </head>
-      <body>
-        <div class="container my-5 text-center">{content}</div>
-      </body>
-    </html>"""
-    return html
+    return EMAIL_TEMPLATE.render(
+        title=title, release_date=release_date, overview=overview, poster_path=poster_path, genres=genres,
+        vote_average=vote_average, vote_count=vote_count, directors=directors, cast=cast, tags_str=tags_str,
+        runtime=movie_details.get('runtime', 'Bilinmiyor'),
+        budget=movie_details.get('budget', 'Bilinmiyor'),
+        revenue=movie_details.get('revenue', 'Bilinmiyor'),
+        imdb_rating=(imdb_rating if imdb_id else None) or "Bilinmiyor",
+        imdb_link=f"https://www.imdb.com/title/{imdb_id}/" if imdb_id else "#",
+        meta_description=overview if len(overview) < 160 else overview[:157] + "...",
+        meta_keywords=f"{title}, {genres}, {tags_str}",
+        json_ld=json.dumps(json_ld, ensure_ascii=False),
+        trailer_url=trailer_url, config=config, custom_embed=custom_embed)
+
+SEARCH_RESULTS_TEMPLATE = app.jinja_env.from_string("""
+<!doctype html>
+<html lang="tr">
+  <head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
+    <title>Film Arama Sonuçları</title>
+    <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css">
+  </head>
+  <body>
+    <div class="container my-5">
+      <h1 class="text-center">Film Arama Sonuçları</h1>
+      <div class="list-group">
+        {% for movie in movies %}
+          <a href="{{ url_for('movie_detail', movie_id=movie['id']) }}" class="list-group-item list-group-item-action">
+            <div class="d-flex align-items-center">
+              {% if movie.poster_path %}
+                <img src="{{ poster_url(movie.poster_path, 'thumb') }}" alt="{{ movie.title }} Poster" style="width:50px; height:75px; object-fit: cover; margin-right:10px;">
+              {% else %}
+                <div style="width:50px; height:75px; margin-right:10px;" class="bg-light"></div>
+              {% endif %}
+              <div>
+                <strong>{{ movie.title }}</strong><br>
+                <small>{{ movie.get('release_date') or 'Tarih bilinmiyor' }}</small>
+              </div>
+            </div>
+          </a>
+        {% endfor %}
+      </div>
+      <div class="text-center mt-4">
+        <a href="{{ url_for('index') }}" class="btn btn-secondary">Yeni Arama</a>
+      </div>
+    </div>
+  </body>
+</html>
+""")
+
+SEARCH_FORM_TEMPLATE = app.jinja_env.from_string("""
+<!doctype html>
+<html lang="tr">
+  <head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
+    <title>Film Arama</title>
+    <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css">
+  </head>
+  <body>
+    <div class="container my-5">
+      <div class="row justify-content-center">
+        <div class="col-md-8">
+          <h1 class="text-center mb-4">Film Arama</h1>
+          <form method="post">
+            <div class="form-group">
+              <label for="query">Film Adı:</label>
+              <input type="text" name="query" id="query" class="form-control" list="query-suggestions" autocomplete="off">
+              <small class="form-text text-muted">Boş bırakılırsa seçilen yıl/türdeki tüm filmler listelenir.</small>
+              <datalist id="query-suggestions"></datalist>
+            </div>
+            <div class="form-group">
+              <label for="year">Yayın Yılı (isteğe bağlı):</label>
+              <input type="text" name="year" id="year" class="form-control">
+            </div>
+            <div class="form-group">
+              <label for="genre">Tür (isteğe bağlı):</label>
+              <select name="genre" id="genre" class="form-control">
+                <option value="">Seçiniz</option>
+                {% for genre in genres %}
+                  <option value="{{ genre.id }}">{{ genre.name }}</option>
+                {% endfor %}
+              </select>
+            </div>
+            <button type="submit" class="btn btn-primary btn-block">Ara</button>
+          </form>
+        </div>
+      </div>
+    </div>
+    <script>
+      (function () {
+        var input = document.getElementById("query"), list = document.getElementById("query-suggestions"), timer, pending;
+        input.addEventListener("input", function () {
+          clearTimeout(timer);
+          timer = setTimeout(function () {
+            if (pending) pending.abort();
+            pending = new AbortController();
+            fetch("{{ url_for('api_search') }}?q=" + encodeURIComponent(input.value), {signal: pending.signal})
+              .then(function (response) { return response.json(); })
+              .then(function (data) {
+                list.innerHTML = "";
+                (data.results || []).forEach(function (movie) {
+                  var option = document.createElement("option");
+                  option.value = movie.title;
+                  option.label = movie.release_date ? movie.release_date.slice(0, 4) : "";
+                  list.appendChild(option);
+                });
+              })
+              .catch(function () {});
+          }, 150);
+        });
+      })();
+    </script>
+  </body>
+</html>
+""")
 
 @app.route("/", methods=["GET", "POST"])
 def index():
-    genres = get_genres()
     if request.method == "POST":
-        query = request.form.get("query", "")
+        query = request.form.get("query", "").strip()
         year = request.form.get("year", "")
         genre_id = request.form.get("genre", "")
-        movies = advanced_search_movies(query, year if year else None, genre_id if genre_id else None) if (year or genre_id) else search_movies(query)
-        return render_template_string("""
-        <!doctype html>
-        <html lang="tr">
-          <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
-            <title>Film Arama Sonuçları</title>
-            <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css">
-          </head>
-          <body>
-            <div class="container my-5">
-              <h1 class="text-center">Film Arama Sonuçları</h1>
-              <div class="list-group">
-                {% for movie in movies %}
-                  <a href="{{ url_for('movie_detail', movie_id=movie['id']) }}" class="list-group-item list-group-item-action">
-                    <div class="d-flex align-items-center">
-                      <img src="https://image.tmdb.org/t/p/w185{{ movie.poster_path }}" alt="{{ movie.title }} Poster" style="width:50px; height:75px; object-fit: cover; margin-right:10px;">
-                      <div>
-                        <strong>{{ movie.title }}</strong><br>
-                        <small>{{ movie.get('release_date', 'Tarih bilinmiyor') }}</small>
-                      </div>
-                    </div>
-                  </a>
-                {% endfor %}
-              </div>
-              <div class="text-center mt-4">
-                <a href="{{ url_for('index') }}" class="btn btn-secondary">Yeni Arama</a>
-              </div>
-            </div>
-          </body>
-        </html>
-        """, movies=movies)
-    return render_template_string("""
-    <!doctype html>
-    <html lang="tr">
-      <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
-        <title>Film Arama</title>
-        <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css">
-      </head>
-      <body>
-        <div class="container my-5">
-          <div class="row justify-content-center">
-            <div class="col-md-8">
-              <h1 class="text-center mb-4">Film Arama</h1>
-              <form method="post">
-                <div class="form-group">
-                  <label for="query">Film Adı:</label>
-                  <input type="text" name="query" id="query" class="form-control" required>
-                </div>
-                <div class="form-group">
-                  <label for="year">Yayın Yılı (isteğe bağlı):</label>
-                  <input type="text" name="year" id="year" class="form-control">
-                </div>
-                <div class="form-group">
-                  <label for="genre">Tür (isteğe bağlı):</label>
-                  <select name="genre" id="genre" class="form-control">
-                    <option value="">Seçiniz</option>
-                    {% for genre in genres %}
-                      <option value="{{ genre.id }}">{{ genre.name }}</option>
-                    {% endfor %}
-                  </select>
-                </div>
-                <button type="submit" class="btn btn-primary btn-block">Ara</button>
-              </form>
-            </div>
+        owner = prefetch_owner()
+        if not query:
+            if not (year or genre_id):
+                return redirect(url_for('index'))
+            # A year/genre sweep can run to thousands of rows; stream them as
+            # discover pages arrive instead of waiting for the last page.
+            movies = discover_movies(year or None, genre_id or None, max_pages=DISCOVER_MAX_PAGES)
+            stream = SEARCH_RESULTS_TEMPLATE.stream(movies=prefetching(movies, owner))
+            stream.enable_buffering(20)
+            return Response(stream_with_context(stream))
+        movies = search_catalog(query, year, genre_id)
+        if not movies:
+            movies = advanced_search_movies(query, year if year else None, genre_id if genre_id else None) if (year or genre_id) else search_movies(query)
+            remember_movies(movies)
+        prefetch_movies(movies, owner)
+        return render_page("search_results", SEARCH_RESULTS_TEMPLATE, movies=movies)
+    try:
+        genres = get_genres()
+    except requests.RequestException as e:
+        # The form still works without the genre list; a search will surface the error.
+        app.logger.warning("Tür listesi alınamadı: %s", e)
+        genres = []
+    return render_page("search_form", SEARCH_FORM_TEMPLATE, genres=genres)
+
+@app.route("/api/discover")
+def api_discover():
+    year, genre_id = request.args.get("year"), request.args.get("genre")
+    if not (year or genre_id):
+        return jsonify({"error": "year ya da genre gerekli."}), 400
+    pages = min(request.args.get("pages", DISCOVER_MAX_PAGES, type=int), TMDB_MAX_DISCOVER_PAGE)
+    failed_pages = []
+    try:
+        movies = discover_movies(year, genre_id, max_pages=pages, on_error=lambda page, e: failed_pages.append(page))
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 502
+    def lines():
+        for movie in movies:
+            yield json.dumps(movie, ensure_ascii=False) + "\n"
+        # The status is long sent; a trailing record tells clients the list is incomplete.
+        if failed_pages:
+            yield json.dumps({"error": "Bazı keşif sayfaları alınamadı.", "failed_pages": sorted(failed_pages)}, ensure_ascii=False) + "\n"
+    return Response(stream_with_context(lines()), mimetype="application/x-ndjson")
+
+@app.route("/api/search")
+def api_search():
+    query = request.args.get("q", "")
+    if len(normalize_query(query)) < AUTOCOMPLETE_MIN_LENGTH:
+        return jsonify({"query": query, "results": []})
+    try:
+        results, source = autocomplete(query)
+    except requests.RequestException as e:
+        return jsonify({"query": query, "error": str(e)}), 502
+    fields = ("id", "title", "original_title", "release_date", "poster_path")
+    return jsonify({"query": query, "source": source,
+                    "results": [{field: movie.get(field) for field in fields} for movie in results[:AUTOCOMPLETE_LIMIT]]})
+
+MOVIE_DETAIL_TEMPLATE = app.jinja_env.from_string("""
+<!doctype html>
+<html lang="tr">
+  <head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
+    <title>{{ movie.title }}</title>
+    <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css">
+  </head>
+  <body>
+    <div class="container my-5 text-center">
+      <h1>{{ movie.title }}</h1>
+      <p><strong>Çıkış Tarihi:</strong> {{ movie.release_date }}</p>
+      <p>{{ movie.overview }}</p>
+      <p><strong>Yönetmen:</strong> {{ directors|join(', ') if directors else 'Bilinmiyor' }}</p>
+      <h2 class="mt-4">Poster</h2>
+      <div>
+        {% if movie.poster_path %}
+          <img src="{{ poster_url(movie.poster_path, 'detail') }}" alt="{{ movie.title }} Poster" class="img-fluid mb-3" style="width:300px; height:450px; object-fit: cover; margin: auto;">
+        {% else %}
+          <p>Poster bulunamadı.</p>
+        {% endif %}
+      </div>
+      <h2 class="mt-4">Fragman</h2>
+      <div>
+        {% if trailer_url %}
+          <div class="embed-responsive embed-responsive-16by9" style="margin: auto;">
+            <iframe class="embed-responsive-item" src="{{ trailer_url }}" allowfullscreen></iframe>
           </div>
-        </div>
-      </body>
-    </html>
-    """, genres=genres)
+        {% else %}
+          <p>Fragman bulunamadı.</p>
+        {% endif %}
+      </div>
+      <div class="mt-4">
+        <a href="{{ url_for('config_form', movie_id=movie.id) }}" class="btn btn-primary">Gönderi Ayarlarını Düzenle</a>
+        <a href="{{ url_for('index') }}" class="btn btn-secondary ml-2">Yeni Arama</a>
+      </div>
+    </div>
+  </body>
+</html>
+""")
 
 @app.route("/movie/<int:movie_id>")
 def movie_detail(movie_id):
-    movie = get_movie_details(movie_id)
-    credits = get_movie_credits(movie_id)
-    trailer_url = get_movie_videos(movie_id)
-    watch_providers = get_watch_providers(movie_id)
+    bundle = get_movie_bundle(movie_id)
+    movie, credits, trailer_url = bundle["movie"], bundle["credits"], bundle["trailer_url"]
     directors = [m['name'] for m in credits.get('crew', []) if m.get('job') == 'Director']
-    return render_template_string("""
-    <!doctype html>
-    <html lang="tr">
-      <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
-        <title>{{ movie.title }}</title>
-        <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css">
-      </head>
-      <body>
-        <div class="container my-5 text-center">
-          <h1>{{ movie.title }}</h1>
-          <p><strong>Çıkış Tarihi:</strong> {{ movie.release_date }}</p>
-          <p>{{ movie.overview }}</p>
-          <p><strong>Yönetmen:</strong> {{ directors|join(', ') if directors else 'Bilinmiyor' }}</p>
-          <h2 class="mt-4">Poster</h2>
-          <div>
-            {% if movie.poster_path %}
-              <img src="https://image.tmdb.org/t/p/w500{{ movie.poster_path }}" alt="{{ movie.title }} Poster" class="img-fluid mb-3" style="width:300px; height:450px; object-fit: cover; margin: auto;">
-            {% else %}
-              <p>Poster bulunamadı.</p>
-            {% endif %}
-          </div>
-          <h2 class="mt-4">Fragman</h2>
-          <div>
-            {% if trailer_url %}
-              <div class="embed-responsive embed-responsive-16by9" style="margin: auto;">
-                <iframe class="embed-responsive-item" src="{{ trailer_url }}" allowfullscreen></iframe>
-              </div>
-            {% else %}
-              <p>Fragman bulunamadı.</p>
-            {% endif %}
-          </div>
-          <div class="mt-4">
-            <a href="{{ url_for('config_form', movie_id=movie.id) }}" class="btn btn-primary">Gönderi Ayarlarını Düzenle</a>
-            <a href="{{ url_for('index') }}" class="btn btn-secondary ml-2">Yeni Arama</a>
-          </div>
+    return render_page("movie_detail", MOVIE_DETAIL_TEMPLATE, movie=movie, directors=directors, trailer_url=trailer_url)
+
+CONFIG_FORM_TEMPLATE = app.jinja_env.from_string("""
+<!doctype html>
+<html lang="tr">
+  <head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
+    <title>{{ movie.title }} - Gönderi Ayarları</title>
+    <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css">
+  </head>
+  <body>
+    <div class="container my-5 text-center">
+      <h1 class="mb-4">{{ movie.title }} - Gönderi Ayarları</h1>
+      <form action="{{ url_for('send_movie_email', movie_id=movie.id) }}" method="post">
+        <input type="hidden" name="idempotency_key" value="{{ idempotency_key }}">
+        <input type="hidden" name="csrf_token" value="{{ csrf_token() }}">
+        <div class="form-group">
+          <label for="custom_embed">Özel Video Embed Kodu (Varsa):</label>
+          <textarea name="custom_embed" id="custom_embed" class="form-control" rows="3" placeholder="Varsa özel video embed kodunu buraya yapıştırın."></textarea>
         </div>
-      </body>
-    </html>
-    """, movie=movie, directors=directors, trailer_url=trailer_url)
+        <div class="form-check">
+          <input type="checkbox" name="include_overview" id="include_overview" class="form-check-input" checked>
+          <label class="form-check-label" for="include_overview">Açıklama</label>
+        </div>
+        <div class="form-check">
+          <input type="checkbox" name="include_directors" id="include_directors" class="form-check-input" checked>
+          <label class="form-check-label" for="include_directors">Yönetmen</label>
+        </div>
+        <div class="form-check">
+          <input type="checkbox" name="include_cast" id="include_cast" class="form-check-input" checked>
+          <label class="form-check-label" for="include_cast">Oyuncular</label>
+        </div>
+        <div class="form-check">
+          <input type="checkbox" name="include_genres" id="include_genres" class="form-check-input" checked>
+          <label class="form-check-label" for="include_genres">Film Kategorisi</label>
+        </div>
+        <div class="form-check">
+          <input type="checkbox" name="include_release_date" id="include_release_date" class="form-check-input" checked>
+          <label class="form-check-label" for="include_release_date">Çıkış Tarihi</label>
+        </div>
+        <div class="form-check">
+          <input type="checkbox" name="include_runtime" id="include_runtime" class="form-check-input" checked>
+          <label class="form-check-label" for="include_runtime">Film Süresi</label>
+        </div>
+        <div class="form-check">
+          <input type="checkbox" name="include_budget" id="include_budget" class="form-check-input" checked>
+          <label class="form-check-label" for="include_budget">Bütçe</label>
+        </div>
+        <div class="form-check">
+          <input type="checkbox" name="include_revenue" id="include_revenue" class="form-check-input" checked>
+          <label class="form-check-label" for="include_revenue">Hasılat</label>
+        </div>
+        <div class="form-check">
+          <input type="checkbox" name="include_tmdb_rating" id="include_tmdb_rating" class="form-check-input" checked>
+          <label class="form-check-label" for="include_tmdb_rating">TMDB Puanı</label>
+        </div>
+        <div class="form-check">
+          <input type="checkbox" name="include_imdb" id="include_imdb" class="form-check-input" checked>
+          <label class="form-check-label" for="include_imdb">IMDb Puanı & Linki</label>
+        </div>
+        <div class="form-check">
+          <input type="checkbox" name="include_trailer" id="include_trailer" class="form-check-input" checked>
+          <label class="form-check-label" for="include_trailer">Otomatik Fragman (Trailer)</label>
+        </div>
+        <button type="submit" class="btn btn-primary btn-block mt-3">Gönderiyi Oluştur</button>
+    <button type="submit" formaction="{{ url_for('preview_post', movie_id=movie.id) }}" formtarget="_blank" class="btn btn-outline-secondary btn-block">Önizle</button>
+      </form>
+      <div class="mt-4">
+        <a href="{{ url_for('movie_detail', movie_id=movie.id) }}" class="btn btn-secondary">Geri Dön</a>
+      </div>
+    </div>
+  </body>
+</html>
+""")
 
 @app.route("/config/<int:movie_id>", methods=["GET"])
 def config_form(movie_id):
-    movie = get_movie_details(movie_id)
-    credits = get_movie_credits(movie_id)
-    trailer_url = get_movie_videos(movie_id)
-    directors = [m['name'] for m in credits.get('crew', []) if m.get('job') == 'Director']
-    return render_template_string("""
-    <!doctype html>
-    <html lang="tr">
-      <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
-        <title>{{ movie.title }} - Gönderi Ayarları</title>
-        <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css">
-      </head>
-      <body>
-        <div class="container my-5 text-center">
-          <h1 class="mb-4">{{ movie.title }} - Gönderi Ayarları</h1>
-          <form action="{{ url_for('send_movie_email', movie_id=movie.id) }}" method="post">
-            <div class="form-group">
-              <label for="custom_embed">Özel Video Embed Kodu (Varsa):</label>
-              <textarea name="custom_embed" id="custom_embed" class="form-control" rows="3" placeholder="Varsa özel video embed kodunu buraya yapıştırın."></textarea>
-            </div>
-            <div class="form-check">
-              <input type="checkbox" name="include_overview" id="include_overview" class="form-check-input" checked>
-              <label class="form-check-label" for="include_overview">Açıklama</label>
-            </div>
-            <div class="form-check">
-              <input type="checkbox" name="include_directors" id="include_directors" class="form-check-input" checked>
-              <label class="form-check-label" for="include_directors">Yönetmen</label>
-            </div>
-            <div class="form-check">
-              <input type="checkbox" name="include_cast" id="include_cast" class="form-check-input" checked>
-              <label class="form-check-label" for="include_cast">Oyuncular</label>
-            </div>
-            <div class="form-check">
-              <input type="checkbox" name="include_genres" id="include_genres" class="form-check-input" checked>
-              <label class="form-check-label" for="include_genres">Film Kategorisi</label>
-            </div>
-            <div class="form-check">
-              <input type="checkbox" name="include_release_date" id="include_release_date" class="form-check-input" checked>
-              <label class="form-check-label" for="include_release_date">Çıkış Tarihi</label>
-            </div>
-            <div class="form-check">
-              <input type="checkbox" name="include_runtime" id="include_runtime" class="form-check-input" checked>
-              <label class="form-check-label" for="include_runtime">Film Süresi</label>
-            </div>
-            <div class="form-check">
-              <input type="checkbox" name="include_budget" id="include_budget" class="form-check-input" checked>
-              <label class="form-check-label" for="include_budget">Bütçe</label>
-            </div>
-            <div class="form-check">
-              <input type="checkbox" name="include_revenue" id="include_revenue" class="form-check-input" checked>
-              <label class="form-check-label" for="include_revenue">Hasılat</label>
-            </div>
-            <div class="form-check">
-              <input type="checkbox" name="include_tmdb_rating" id="include_tmdb_rating" class="form-check-input" checked>
-              <label class="form-check-label" for="include_tmdb_rating">TMDB Puanı</label>
-            </div>
-            <div class="form-check">
-              <input type="checkbox" name="include_imdb" id="include_imdb" class="form-check-input" checked>
-              <label class="form-check-label" for="include_imdb">IMDb Puanı & Linki</label>
-            </div>
-            <div class="form-check">
-              <input type="checkbox" name="include_trailer" id="include_trailer" class="form-check-input" checked>
-              <label class="form-check-label" for="include_trailer">Otomatik Fragman (Trailer)</label>
-            </div>
-            <button type="submit" class="btn btn-primary btn-block mt-3">Gönderiyi Oluştur</button>
-          </form>
-          <div class="mt-4">
-            <a href="{{ url_for('movie_detail', movie_id=movie.id) }}" class="btn btn-secondary">Geri Dön</a>
-          </div>
-        </div>
-      </body>
-    </html>
-    """, movie=movie)
+    movie = get_movie_bundle(movie_id)["movie"]
+    return render_page("config_form", CONFIG_FORM_TEMPLATE, movie=movie, idempotency_key=uuid.uuid4().hex)
 
 @app.route("/send_email/<int:movie_id>", methods=["POST"])
 def send_movie_email(movie_id):
-    movie = get_movie_details(movie_id)
-    trailer_url = get_movie_videos(movie_id)
-    credits = get_movie_credits(movie_id)
-    keywords = get_movie_keywords(movie_id)
-    config = {
-      "include_overview": True if request.form.get("include_overview")=="on" else False,
-      "include_directors": True if request.form.get("include_directors")=="on" else False,
-      "include_cast": True if request.form.get("include_cast")=="on" else False,
-      "include_genres": True if request.form.get("include_genres")=="on" else False,
-      "include_release_date": True if request.form.get("include_release_date")=="on" else False,
-      "include_runtime": True if request.form.get("include_runtime")=="on" else False,
-      "include_budget": True if request.form.get("include_budget")=="on" else False,
-      "include_revenue": True if request.form.get("include_revenue")=="on" else False,
-      "include_tmdb_rating": True if request.form.get("include_tmdb_rating")=="on" else False,
-      "include_imdb": True if request.form.get("include_imdb")=="on" else False,
-      "include_trailer": True if request.form.get("include_trailer")=="on" else False,
+    if not csrf_valid():
+        abort(403)
+    # The config form mints a fresh key per render, so a double submit is
+    # deduplicated while posting the same movie again later still works.
+    key = request.form.get("idempotency_key", "").strip()
+    if not key:
+        abort(400, description="idempotency_key alanı gerekli.")
+    payload = {
+        "movie_id": movie_id,
+        "config": parse_post_config(request.form),
+        "custom_embed": request.form.get("custom_embed", "").strip(),
     }
-    custom_embed = request.form.get("custom_embed", "").strip()
-    html_content = create_email_html(movie, trailer_url, credits, keywords, config, custom_embed)
-    subject = f"{movie.get('title', 'Film Detayları')} film izle"
+    job_id, created = job_queue.enqueue("post", payload, idempotency_key=f"post:{key}")
+    if created:
+        notify("Gönderi kuyruğa alındı.", "success")
+    return redirect(url_for('job_status', job_id=job_id))
+
+# Without SECRET_KEY there is no session to keep the token in; like
+# prefetch_owner(), fall back to the client address, signed with a key that
+# lives as long as the process.
+CSRF_FALLBACK_KEY = secrets.token_bytes(32)
+
+@app.template_global()
+def csrf_token():
+    if not app.secret_key:
+        return hmac.new(CSRF_FALLBACK_KEY, (request.remote_addr or "").encode(), hashlib.sha256).hexdigest()
+    token = session.get("csrf_token")
+    if token is None:
+        token = session["csrf_token"] = secrets.token_urlsafe(32)
+    return token
+
+def notify(message, category):
+    # Flashed messages live in the session too; without SECRET_KEY drop them
+    # instead of failing a request whose work is already done.
+    if app.secret_key:
+        flash(message, category)
+
+def csrf_valid():
+    expected = session.get("csrf_token") if app.secret_key else csrf_token()
+    return bool(expected) and hmac.compare_digest(request.form.get("csrf_token", ""), expected)
+
+# The preview is the raw post, custom_embed included, so it must never run
+# with this app's origin: the sandbox gives it an opaque origin while still
+# letting the trailer embeds play.
+PREVIEW_HEADERS = {"Content-Security-Policy": "sandbox allow-scripts allow-popups", "X-Content-Type-Options": "nosniff"}
+
+@app.route("/preview/<int:movie_id>", methods=["POST"])
+def preview_post(movie_id):
+    if not csrf_valid():
+        abort(403)
     try:
-        send_email(subject, html_content)
-        flash("Film bilgileri e-posta ile gönderildi.", "success")
+        data = gather_post_data(movie_id)
     except Exception as e:
-        flash(f"E-posta gönderiminde hata: {e}", "error")
-    return redirect(url_for('movie_detail', movie_id=movie_id))
+        notify(f"Film bilgileri alınamadı: {e}", "error")
+        return redirect(url_for('movie_detail', movie_id=movie_id))
+    _, html_content = render_post(data, parse_post_config(request.form), request.form.get("custom_embed", "").strip())
+    return Response(html_content, mimetype="text/html", headers=PREVIEW_HEADERS)
+
+JOB_STATUS_TEMPLATE = app.jinja_env.from_string("""
+<!doctype html>
+<html lang="tr">
+  <head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
+    {% if job.status in ('queued', 'running') %}<meta http-equiv="refresh" content="2">{% endif %}
+    <title>Gönderi Durumu</title>
+    <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css">
+  </head>
+  <body>
+    <div class="container my-5 text-center">
+      <h1 class="mb-4">Gönderi Durumu</h1>
+      {% set labels = {'queued': 'Kuyrukta', 'running': 'Hazırlanıyor', 'done': 'Gönderildi', 'failed': 'Başarısız'} %}
+      {% set styles = {'queued': 'secondary', 'running': 'info', 'done': 'success', 'failed': 'danger'} %}
+      <p><span class="badge badge-{{ styles[job.status] }} p-2">{{ labels[job.status] }}</span></p>
+      {% if job.result and job.result.subject %}<p><strong>{{ job.result.subject }}</strong></p>{% endif %}
+      {% if job.result and job.result.run_id %}
+        <p><strong>{{ job.result.sent }}</strong> gönderildi, {{ job.result.skipped }} atlandı, {{ job.result.failed }} hata ({{ job.result.elapsed }} sn)</p>
+        {% for failure in job.result.failures %}<p><small>{{ failure.movie_id }} ({{ failure.stage }}): {{ failure.error }}</small></p>{% endfor %}
+      {% endif %}
+      <p><small>Deneme: {{ job.attempts }}</small></p>
+      {% if job.last_error %}<div class="alert alert-warning">{{ job.last_error }}</div>{% endif %}
+      <div class="mt-4">
+        {% if job.payload.movie_id %}<a href="{{ url_for('movie_detail', movie_id=job.payload.movie_id) }}" class="btn btn-secondary mr-2">Filme Dön</a>{% endif %}
+        <a href="{{ url_for('index') }}" class="btn btn-secondary">Yeni Arama</a>
+      </div>
+    </div>
+  </body>
+</html>
+""")
+
+@app.route("/jobs/<int:job_id>")
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404)
+    return render_page("job_status", JOB_STATUS_TEMPLATE, job=job)
+
+def bulk_movie_ids(spec):
+    if spec.get("movie_ids"):
+        return [int(movie_id) for movie_id in spec["movie_ids"]]
+    discover = spec.get("discover") or {}
+    def discovered_ids():
+        with priority("batch"):
+            for movie in discover_movies(discover.get("year"), discover.get("genre"), int(discover.get("pages", 1))):
+                yield movie["id"]
+    return discovered_ids()
+
+def parse_movie_ids(values):
+    # JSON numbers, or digit strings from --ids and --ids-file.
+    movie_ids = []
+    for value in values:
+        if isinstance(value, bool) or not (isinstance(value, int) or (isinstance(value, str) and value.strip().isdigit())):
+            raise ValueError(f"Geçersiz film kimliği: {value!r}")
+        movie_ids.append(int(value))
+    return movie_ids
+
+@app.route("/api/bulk", methods=["POST"])
+def bulk_post():
+    spec = request.get_json(silent=True)
+    if not isinstance(spec, dict):
+        spec = {}
+    if not spec.get("run_id") or not (spec.get("movie_ids") or spec.get("discover")):
+        return jsonify({"error": "run_id ile movie_ids ya da discover alanı gerekli."}), 400
+    for field, kind in (("movie_ids", list), ("discover", dict), ("config", dict)):
+        if field in spec and not isinstance(spec[field], kind):
+            return jsonify({"error": f"{field} alanı {'liste' if kind is list else 'nesne'} olmalı."}), 400
+    try:
+        movie_ids = parse_movie_ids(spec.get("movie_ids") or [])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    pages = (spec.get("discover") or {}).get("pages", 1)
+    if isinstance(pages, bool) or not isinstance(pages, int) or pages < 1:
+        return jsonify({"error": "discover.pages pozitif bir tam sayı olmalı."}), 400
+    config = {flag: bool(spec.get("config", {}).get(flag, True)) for flag in POST_CONFIG_FLAGS}
+    payload = dict(spec, movie_ids=movie_ids, config=config)
+    job_id, created = job_queue.enqueue("bulk", payload, idempotency_key=f"bulk:{spec['run_id']}")
+    return jsonify({"job_id": job_id, "created": created, "status_url": url_for('job_status', job_id=job_id)}), 202 if created else 200
+
+@app.cli.command("bulk-post", help="Film kimliklerini ya da bir keşif sorgusunu Blogger gönderilerine dönüştürür.")
+@click.option("--run-id", required=True, help="Yarıda kalan bir çalıştırmayı sürdürmek için aynı kimliği verin.")
+@click.option("--ids", help="Virgülle ayrılmış TMDB film kimlikleri.")
+@click.option("--ids-file", type=click.File(), help="Her satırda bir TMDB film kimliği bulunan dosya.")
+@click.option("--year", help="Keşif sorgusu: yayın yılı.")
+@click.option("--genre", help="Keşif sorgusu: tür kimliği.")
+@click.option("--pages", default=1, show_default=True, help="Keşif sorgusunda taranacak sayfa sayısı.")
+@click.option("--exclude", multiple=True, type=click.Choice(POST_CONFIG_FLAGS), help="Gönderiden çıkarılacak bölüm.")
+@click.option("--custom-embed", default="", help="Her gönderiye eklenecek özel video embed kodu.")
+@click.option("--fetch-workers", default=4, show_default=True)
+@click.option("--render-workers", default=2, show_default=True)
+@click.option("--batch-size", default=10, show_default=True)
+def bulk_post_command(run_id, ids, ids_file, year, genre, pages, exclude, custom_embed, fetch_workers, render_workers, batch_size):
+    movie_ids = [part.strip() for part in (ids or "").split(",") if part.strip()]
+    if ids_file:
+        movie_ids += [line.strip() for line in ids_file if line.strip()]
+    try:
+        movie_ids = parse_movie_ids(movie_ids)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--ids / --ids-file")
+    if not movie_ids and not (year or genre):
+        raise click.UsageError("--ids, --ids-file ya da --year/--genre verilmeli.")
+    spec = {"movie_ids": movie_ids, "discover": {"year": year, "genre": genre, "pages": pages}}
+    config = {flag: flag not in exclude for flag in POST_CONFIG_FLAGS}
+    progress = lambda report: click.echo(f"{report.sent} gönderildi, {len(report.failures)} hata, {report.elapsed:.1f} sn")
+    try:
+        report = run_bulk_post(run_id, bulk_movie_ids(spec), config, custom_embed, fetch_workers=fetch_workers,
+                               render_workers=render_workers, batch_size=batch_size, progress=progress)
+    except RunInProgress as e:
+        raise click.ClickException(str(e))
+    click.echo(json.dumps(report.as_dict(), ensure_ascii=False, indent=2))
+
+@app.cli.command("catalog-ingest", help="TMDB günlük film kimliği dışa aktarımını (dosya yolu ya da URL) yerel kataloğa işler.")
+@click.argument("source")
+@click.option("--prune", is_flag=True, help="Bu dışa aktarımda artık bulunmayan filmleri katalogdan sil.")
+def catalog_ingest_command(source, prune):
+    started = time.monotonic()
+    count, removed = movie_catalog.ingest_export(source, prune=prune)
+    click.echo(f"{count} film işlendi, {removed} film silindi ({time.monotonic() - started:.1f} sn).")
+
+def preload_genres():
+    # Warm the genre list off the request path so the first search form
+    # render does not wait on TMDB.
+    upstream_pool.submit(get_genres).add_done_callback(
+        lambda future: future.exception() and app.logger.warning("Tür listesi önceden yüklenemedi: %s", future.exception()))
+
+@app.template_global()
+def poster_url(poster_path, variant):
+    return url_for('poster', variant=variant, filename=poster_path.lstrip('/'))
+
+@app.route("/poster/<variant>/<filename>")
+def poster(variant, filename):
+    # Pages link here instead of hotlinking TMDB: each poster is downloaded
+    # and resized once, then served from disk with a year-long cache lifetime.
+    # Blogger posts keep the TMDB URLs since readers never reach this app.
+    try:
+        path, digest, mimetype = poster_cache.get(variant, filename)
+    except ValueError:
+        abort(404)
+    except requests.HTTPError as e:
+        abort(404 if e.response is not None and e.response.status_code == 404 else 502)
+    except requests.RequestException:
+        abort(502)
+    response = send_file(path, mimetype=mimetype, etag=digest, max_age=POSTER_MAX_AGE, conditional=True)
+    response.cache_control.immutable = True
+    return response
+
+@app.cli.command("warm-posters", help="Katalogdaki filmlerin posterlerini önceden indirip küçültür.")
+@click.option("--limit", type=int, help="En popüler N film (varsayılan: tümü).")
+@click.option("--variant", "variants", multiple=True, type=click.Choice(sorted(VARIANTS)), help="Varsayılan: tüm boyutlar.")
+@click.option("--workers", default=4, show_default=True)
+def warm_posters_command(limit, variants, workers):
+    started = time.monotonic()
+    names = movie_catalog.poster_paths(limit)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warm-posters") as pool:
+        warmed, failed = poster_cache.warm(names, variants or sorted(VARIANTS), pool)
+    click.echo(f"{warmed} poster hazırlandı, {failed} hata, önbellek {poster_cache.total_bytes() / 1024 / 1024:.1f} MB "
+               f"({time.monotonic() - started:.1f} sn).")
+
+@app.route("/api/ratelimit")
+def ratelimit_status():
+    return jsonify({"buckets": upstream_scheduler.status(), "omdb_daily": omdb_quota.status()})
+
+def cache_lookups():
+    return {(namespace, result): count for namespace, counters in response_cache.stats().items() for result, count in counters.items()}
+
+metrics.gauge("cache_lookups_total", "Response cache lookups by namespace and result.", ("namespace", "result"), cache_lookups, kind="counter")
+metrics.gauge("prefetch_total", "Prefetch outcomes.", ("outcome",), lambda: {(outcome,): count for outcome, count in prefetcher.stats.items()}, kind="counter")
+metrics.gauge("ratelimit_waiting", "Requests queued for a rate limit token.", ("upstream",),
+              lambda: {(name,): status["waiting"] for name, status in upstream_scheduler.status().items()})
+metrics.gauge("omdb_quota_remaining", "OMDb requests left today.", (), lambda: {(): omdb_quota.remaining()})
+metrics.gauge("poster_cache_bytes", "Bytes stored in the poster cache.", (), lambda: {(): poster_cache.total_bytes()})
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/cache/stats")
+def cache_stats():
+    return jsonify(dict(response_cache.stats(), prefetch=prefetcher.stats))
+
+preload_genres()
 
 if __name__ == "__main__":
     app.run(debug=True)
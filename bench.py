@@ -0,0 +1,216 @@
+"""Offline benchmark: runs the app against local TMDB/OMDb/SMTP stubs.
+
+    python bench.py --concurrency 8 --requests 200
+    python bench.py --save-baseline          # record bench_baseline.json
+    python bench.py --baseline bench_baseline.json
+
+Every route is driven for --requests requests at --concurrency, and the run
+fails (exit 1) when p95 latency, throughput or upstream calls per request
+regress past --tolerance compared with the baseline.
+"""
+import itertools, json, logging, math, os, re, sys, tempfile, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+import click, requests
+from stubs import Faults, OMDbStub, SMTPStub, TMDBStub, load_fixture
+
+ROUTES = ("/", "/movie/<id>", "/config/<id>", "/send_email/<id>")
+UPSTREAMS = ("tmdb", "omdb", "smtp")
+JOB_DRAIN_TIMEOUT = 120
+# Below this, p95 differences are scheduler noise rather than regressions.
+MIN_LATENCY_SLACK_MS = 5.0
+CALLS_SLACK = 0.05
+
+def percentile(values, q):
+    # Nearest-rank, so the reported value is a latency that actually happened.
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+def configure_environment(stubs, workdir):
+    tmdb_stub, omdb_stub, smtp_stub = stubs
+    os.environ.update({
+        "TMDB_BASE_URL": tmdb_stub.url + "/3",
+        "OMDB_BASE_URL": omdb_stub.url,
+        "TMDB_API_KEY": "bench",
+        "OMDB_API_KEY": "bench",
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": str(smtp_stub.port),
+        "SMTP_STARTTLS": "0",
+        "EMAIL_ADDRESS": "bench@example.com",
+        "EMAIL_PASSWORD": "",
+        "BLOGGER_EMAIL": "blog@example.com",
+        "SECRET_KEY": "bench",
+        # Fresh state every run; a developer's .env must not leak in.
+        "CACHE_DB_PATH": "",
+        "JOBS_DB_PATH": os.path.join(workdir, "jobs.db"),
+        "CATALOG_DB_PATH": os.path.join(workdir, "catalog.db"),
+        "QUOTA_DB_PATH": os.path.join(workdir, "quota.db"),
+        "POSTER_CACHE_DIR": os.path.join(workdir, "posters"),
+    })
+
+def start_app():
+    # Imported only now: app.py reads its configuration at import time.
+    import app as film_app
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, film_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-app", daemon=True).start()
+    return film_app, server, f"http://127.0.0.1:{server.server_port}"
+
+def route_requests(route, movie_ids, queries):
+    # Yields (method, path, form, expected status) forever.
+    if route == "/":
+        for query in itertools.cycle(queries):
+            yield "POST", "/", {"query": query}, 200
+    for movie_id in itertools.cycle(movie_ids):
+        if route == "/movie/<id>":
+            yield "GET", f"/movie/{movie_id}", None, 200
+        elif route == "/config/<id>":
+            yield "GET", f"/config/{movie_id}", None, 200
+        else:
+            form = {flag: "on" for flag in ("include_overview", "include_directors", "include_cast", "include_genres",
+                                             "include_release_date", "include_runtime", "include_tmdb_rating",
+                                             "include_imdb", "include_trailer")}
+            yield "POST", f"/send_email/{movie_id}", dict(form, idempotency_key=uuid.uuid4().hex), 302
+
+def drive(base_url, route, count, concurrency, movie_ids, queries):
+    plan = list(itertools.islice(route_requests(route, movie_ids, queries), count))
+    local = threading.local()
+    def call(item):
+        method, path, form, expected = item
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+            if route == "/send_email/<id>":
+                # Posting needs the form's CSRF token, bound to this session.
+                page = session.get(f"{base_url}/config/{movie_ids[0]}", timeout=60).text
+                local.csrf_token = re.search(r'name="csrf_token" value="([^"]+)"', page).group(1)
+        if form is not None and route == "/send_email/<id>":
+            form = dict(form, csrf_token=local.csrf_token)
+        started = time.perf_counter()
+        try:
+            response = session.request(method, base_url + path, data=form, allow_redirects=False, timeout=60)
+            response.content
+        except requests.RequestException:
+            return time.perf_counter() - started, False, None
+        return time.perf_counter() - started, response.status_code == expected, response.headers.get("Location")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench-client") as pool:
+        outcomes = list(pool.map(call, plan))
+    return time.perf_counter() - started, outcomes
+
+def wait_for_jobs(film_app, locations):
+    # /send_email only enqueues; the upstream and SMTP work happens in the job
+    # workers, so the route's calls are counted once its jobs have settled.
+    job_ids = [int(location.rstrip("/").rsplit("/", 1)[1]) for location in locations if location]
+    deadline = time.monotonic() + JOB_DRAIN_TIMEOUT
+    pending = set(job_ids)
+    while pending and time.monotonic() < deadline:
+        pending = {job_id for job_id in pending if film_app.job_queue.get(job_id)["status"] not in ("done", "failed")}
+        if pending:
+            time.sleep(0.05)
+    failed = sum(1 for job_id in job_ids if film_app.job_queue.get(job_id)["status"] != "done")
+    return failed
+
+def run(options):
+    faults = lambda offset: Faults(options["latency_ms"] / 1000, options["jitter_ms"] / 1000, options["error_rate"],
+                                   seed=None if options["seed"] is None else options["seed"] + offset)
+    stubs = (TMDBStub(faults(0)).start(), OMDbStub(faults(1)).start(), SMTPStub(faults(2)).start())
+    workdir = tempfile.mkdtemp(prefix="filmbot-bench-")
+    configure_environment(stubs, workdir)
+    film_app, server, base_url = start_app()
+    movie_ids = sorted(load_fixture("bench_tmdb.json")["movies"], key=int)
+    queries = [movie["original_title"].split()[-1].lower() for movie in load_fixture("bench_tmdb.json")["search"]["results"]]
+    results = {}
+    try:
+        for route in options["routes"]:
+            before = {stub.name: stub.calls for stub in stubs}
+            elapsed, outcomes = drive(base_url, route, options["requests"], options["concurrency"], movie_ids, queries)
+            errors = sum(1 for _, ok, _ in outcomes if not ok)
+            if route == "/send_email/<id>":
+                errors += wait_for_jobs(film_app, [location for _, ok, location in outcomes if ok])
+            latencies = [seconds * 1000 for seconds, _, _ in outcomes]
+            results[route] = {
+                "requests": len(outcomes),
+                "errors": errors,
+                "p50_ms": round(percentile(latencies, 50), 2),
+                "p95_ms": round(percentile(latencies, 95), 2),
+                "p99_ms": round(percentile(latencies, 99), 2),
+                "throughput_rps": round(len(outcomes) / elapsed, 2),
+                "upstream_calls_per_request": {stub.name: round((stub.calls - before[stub.name]) / len(outcomes), 3) for stub in stubs},
+            }
+    finally:
+        server.shutdown()
+        for stub in stubs:
+            stub.stop()
+    return {"settings": options, "routes": results}
+
+def compare(current, baseline, tolerance):
+    regressions = []
+    for route, base in baseline["routes"].items():
+        now = current["routes"].get(route)
+        if now is None:
+            continue
+        p95_limit = max(base["p95_ms"] * (1 + tolerance), base["p95_ms"] + MIN_LATENCY_SLACK_MS)
+        if now["p95_ms"] > p95_limit:
+            regressions.append(f"{route}: p95 {now['p95_ms']:.1f} ms > {p95_limit:.1f} ms")
+        if now["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{route}: {now['throughput_rps']:.1f} req/s < {base['throughput_rps'] * (1 - tolerance):.1f} req/s")
+        if now["errors"] > base["errors"]:
+            regressions.append(f"{route}: {now['errors']} errors (baseline {base['errors']})")
+        for upstream, calls in now["upstream_calls_per_request"].items():
+            limit = base["upstream_calls_per_request"].get(upstream, 0) + CALLS_SLACK
+            if calls > limit:
+                regressions.append(f"{route}: {calls:.3f} {upstream} calls/request > {limit:.3f}")
+    return regressions
+
+def print_report(report):
+    header = f"{'route':<18} {'req':>5} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}  " + " ".join(f"{name:>6}" for name in UPSTREAMS)
+    click.echo(header)
+    click.echo("-" * len(header))
+    for route, row in report["routes"].items():
+        calls = " ".join(f"{row['upstream_calls_per_request'].get(name, 0):>6.2f}" for name in UPSTREAMS)
+        click.echo(f"{route:<18} {row['requests']:>5} {row['errors']:>4} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                   f"{row['p99_ms']:>8.1f} {row['throughput_rps']:>8.1f}  {calls}")
+    click.echo("(last columns: upstream calls per request)")
+
+@click.command(help="Runs the app against local stub servers and reports latency per route.")
+@click.option("--concurrency", default=8, show_default=True)
+@click.option("--requests", "request_count", default=200, show_default=True, help="Requests per route.")
+@click.option("--route", "routes", multiple=True, type=click.Choice(ROUTES), help="Default: all routes.")
+@click.option("--latency-ms", default=40.0, show_default=True, help="Injected upstream latency.")
+@click.option("--jitter-ms", default=10.0, show_default=True)
+@click.option("--error-rate", default=0.0, show_default=True, help="Share of upstream calls that fail (503 / SMTP 451).")
+@click.option("--seed", type=int, default=1, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False), help="Write the results as JSON.")
+@click.option("--baseline", type=click.Path(dir_okay=False), help="Fail when results regress against this file.")
+@click.option("--save-baseline", type=click.Path(dir_okay=False), is_flag=False, flag_value="bench_baseline.json",
+              help="Store the results as the new baseline.")
+@click.option("--tolerance", default=0.25, show_default=True, help="Allowed p95/throughput regression, as a fraction.")
+def main(concurrency, request_count, routes, latency_ms, jitter_ms, error_rate, seed, output, baseline, save_baseline, tolerance):
+    # Runs are only comparable when all of these match; routes included, since
+    # earlier routes warm the caches for later ones.
+    settings = {"concurrency": concurrency, "requests": request_count, "routes": list(routes or ROUTES), "latency_ms": latency_ms,
+                "jitter_ms": jitter_ms, "error_rate": error_rate, "seed": seed}
+    baseline_data = None
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            baseline_data = json.load(f)
+        mismatched = [key for key, value in settings.items() if baseline_data["settings"].get(key, value) != value]
+        if mismatched:
+            raise click.UsageError(f"Baseline was recorded with different settings: {', '.join(mismatched)}")
+    report = run(settings)
+    print_report(report)
+    for path in filter(None, (output, save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if baseline_data is not None:
+        regressions = compare(report, baseline_data, tolerance)
+        for regression in regressions:
+            click.echo(f"REGRESSION {regression}", err=True)
+        if regressions:
+            sys.exit(1)
+        click.echo(f"No regressions against {baseline}.")
+
+if __name__ == "__main__":
+    main()
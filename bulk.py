@@ -0,0 +1,193 @@
+import logging, queue, sqlite3, threading, time, uuid
+
+logger = logging.getLogger(__name__)
+
+DONE = object()
+
+class RunInProgress(RuntimeError):
+    pass
+
+class BulkLedger:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute("""
+            CREATE TABLE IF NOT EXISTS bulk_items (
+                run_id TEXT NOT NULL,
+                movie_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                subject TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (run_id, movie_id)
+            )""")
+        self._conn().execute("""
+            CREATE TABLE IF NOT EXISTS bulk_runs (
+                run_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                locked_until REAL NOT NULL
+            )""")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def sent_ids(self, run_id):
+        rows = self._conn().execute("SELECT movie_id FROM bulk_items WHERE run_id = ? AND status = 'sent'", (run_id,))
+        return {row[0] for row in rows}
+
+    def acquire(self, run_id, owner, lease):
+        # Succeeds when the run is free, its holder stopped renewing, or we
+        # already hold it; the conditional upsert makes that one atomic step.
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT INTO bulk_runs (run_id, owner, locked_until) VALUES (?, ?, ?) "
+            "ON CONFLICT (run_id) DO UPDATE SET owner = excluded.owner, locked_until = excluded.locked_until "
+            "WHERE bulk_runs.owner = excluded.owner OR bulk_runs.locked_until < ?",
+            (run_id, owner, now + lease, now))
+        return cursor.rowcount == 1
+
+    def release(self, run_id, owner):
+        self._conn().execute("DELETE FROM bulk_runs WHERE run_id = ? AND owner = ?", (run_id, owner))
+
+    def mark(self, run_id, movie_id, status, subject=None, error=None):
+        self._conn().execute("INSERT OR REPLACE INTO bulk_items (run_id, movie_id, status, subject, error, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                             (run_id, movie_id, status, subject, error, time.time()))
+
+class BulkReport:
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.sent = 0
+        self.skipped = 0
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def fail(self, movie_id, stage, error):
+        with self._lock:
+            self.failures.append({"movie_id": movie_id, "stage": stage, "error": str(error)})
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def as_dict(self):
+        return {
+            "run_id": self.run_id,
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "failed": len(self.failures),
+            "failures": self.failures,
+            "elapsed": round(self.elapsed, 2),
+            "posts_per_minute": round(self.sent / self.elapsed * 60, 1) if self.elapsed else 0.0,
+        }
+
+def _stage(inbox, outbox, workers, work, report, name):
+    def loop():
+        while True:
+            item = inbox.get()
+            if item is DONE:
+                return
+            movie_id, value = item
+            try:
+                outbox.put((movie_id, work(movie_id, value)))
+            except Exception as e:
+                logger.warning("Toplu gönderi %s aşamasında %s başarısız: %s", name, movie_id, e)
+                report.fail(movie_id, name, e)
+    threads = [threading.Thread(target=loop, name=f"bulk-{name}-{i}", daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    def close():
+        for _ in threads:
+            inbox.put(DONE)
+        for thread in threads:
+            thread.join()
+    return close
+
+def run_bulk(run_id, movie_ids, fetch, render, send_batch, ledger, lease=60, **options):
+    # Two live runs with one run_id would both see the same ledger snapshot and
+    # both send whatever neither had finished yet, so a run holds the id for
+    # as long as it is alive and keeps renewing it.
+    owner = uuid.uuid4().hex
+    if not ledger.acquire(run_id, owner, lease):
+        raise RunInProgress(f"Toplu gönderi {run_id} başka bir çalıştırmada sürüyor")
+    stop = threading.Event()
+    def keep_alive():
+        while not stop.wait(lease / 3):
+            if not ledger.acquire(run_id, owner, lease):
+                logger.error("Toplu gönderi %s kilidi başka bir çalıştırmaya geçti", run_id)
+    heartbeat = threading.Thread(target=keep_alive, name=f"bulk-lease-{run_id}", daemon=True)
+    heartbeat.start()
+    try:
+        return _run_bulk(run_id, movie_ids, fetch, render, send_batch, ledger, **options)
+    finally:
+        stop.set()
+        heartbeat.join()
+        ledger.release(run_id, owner)
+
+def _run_bulk(run_id, movie_ids, fetch, render, send_batch, ledger, fetch_workers=4, render_workers=2,
+              batch_size=10, queue_size=32, progress=None):
+    # fetch -> render -> send, each stage with its own worker count and a bounded
+    # queue in between, so a slow SMTP server back-pressures TMDB instead of
+    # piling up rendered posts in memory.
+    report = BulkReport(run_id)
+    already_sent = ledger.sent_ids(run_id)
+    fetch_queue, render_queue, send_queue = queue.Queue(queue_size), queue.Queue(queue_size), queue.Queue(queue_size)
+    close_fetch = _stage(fetch_queue, render_queue, fetch_workers, lambda movie_id, _: fetch(movie_id), report, "fetch")
+    close_render = _stage(render_queue, send_queue, render_workers, render, report, "render")
+
+    def feed():
+        seen = set()
+        try:
+            for movie_id in movie_ids:
+                if movie_id in seen:
+                    continue
+                seen.add(movie_id)
+                if movie_id in already_sent:
+                    report.skipped += 1
+                    continue
+                fetch_queue.put((movie_id, None))
+        except Exception as e:
+            logger.warning("Toplu gönderi listesi okunamadı: %s", e)
+            report.fail(None, "feed", e)
+        finally:
+            close_fetch()
+            close_render()
+            send_queue.put(DONE)
+    feeder = threading.Thread(target=feed, name="bulk-feed", daemon=True)
+    feeder.start()
+
+    def flush(batch):
+        failures = dict(send_batch([post for _, post in batch]))
+        for index, (movie_id, (subject, _)) in enumerate(batch):
+            if index in failures:
+                report.fail(movie_id, "send", failures[index])
+                ledger.mark(run_id, movie_id, "failed", subject, str(failures[index]))
+            else:
+                report.sent += 1
+                ledger.mark(run_id, movie_id, "sent", subject)
+        if progress:
+            progress(report)
+
+    batch = []
+    while True:
+        item = send_queue.get()
+        if item is DONE:
+            break
+        batch.append(item)
+        if len(batch) >= batch_size or send_queue.empty():
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    feeder.join()
+    for failure in report.failures:
+        if failure["stage"] in ("fetch", "render"):
+            ledger.mark(run_id, failure["movie_id"], "failed", error=failure["error"])
+    report.finished_at = time.monotonic()
+    return report
@@ -0,0 +1,182 @@
+import functools, inspect, json, sqlite3, threading, time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+MISS = object()
+
+def make_key(namespace, args, kwargs):
+    return namespace + ":" + json.dumps([args, kwargs], sort_keys=True, default=str)
+
+class LRUCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return MISS
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._data[key]
+                return MISS
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, expires_at=None):
+        with self._lock:
+            self._data[key] = (expires_at or time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class SQLiteCache:
+    PURGE_EVERY = 500
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._conn().execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return MISS, None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                     (key, json.dumps(value, ensure_ascii=False), time.time() + ttl))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache")
+
+class ResponseCache:
+    def __init__(self, maxsize=1024, db_path=None):
+        self.memory = LRUCache(maxsize)
+        self.disk = SQLiteCache(db_path) if db_path else None
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _count(self, namespace, outcome):
+        with self._lock:
+            counters = self._stats.setdefault(namespace, {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+            counters[outcome] += 1
+
+    def get(self, namespace, key):
+        value = self.memory.get(key)
+        if value is not MISS:
+            self._count(namespace, "memory_hits")
+            return value
+        if self.disk is not None:
+            value, expires_at = self.disk.get(key)
+            if value is not MISS:
+                self.memory.set(key, value, 0, expires_at=expires_at)
+                self._count(namespace, "disk_hits")
+                return value
+        self._count(namespace, "misses")
+        return MISS
+
+    def contains(self, key):
+        if self.memory.get(key) is not MISS:
+            return True
+        return self.disk is not None and self.disk.get(key)[0] is not MISS
+
+    def set(self, key, value, ttl):
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        with self._lock:
+            return {namespace: dict(counters) for namespace, counters in self._stats.items()}
+
+    def cached(self, namespace, ttl):
+        def decorator(func):
+            signature = inspect.signature(func)
+            def key_for(args, kwargs):
+                # f(550) and f(550, 'tr-TR') must share an entry, so key on the
+                # bound arguments with defaults filled in, not on the raw call.
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                return make_key(namespace, (), bound.arguments)
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = key_for(args, kwargs)
+                value = self.get(namespace, key)
+                if value is not MISS:
+                    return value
+                value = func(*args, **kwargs)
+                # None means "not now" (e.g. an OMDb lookup deferred by the quota);
+                # a real negative answer must be returned as a value to be cached.
+                if value is not None:
+                    self.set(key, value, ttl)
+                return value
+            wrapper.is_cached = lambda *args, **kwargs: self.contains(key_for(args, kwargs))
+            return wrapper
+        return decorator
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
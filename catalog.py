@@ -0,0 +1,163 @@
+import gzip, io, json, re, sqlite3, threading
+import requests
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    original_title TEXT,
+    release_date TEXT,
+    release_year INTEGER,
+    poster_path TEXT,
+    popularity REAL NOT NULL DEFAULT 0,
+    generation INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS movies_year ON movies (release_year);
+CREATE TABLE IF NOT EXISTS movie_genres (
+    genre_id INTEGER NOT NULL,
+    movie_id INTEGER NOT NULL,
+    PRIMARY KEY (genre_id, movie_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5(
+    title, original_title, content='movies', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS movies_ai AFTER INSERT ON movies BEGIN
+    INSERT INTO movies_fts (rowid, title, original_title) VALUES (new.id, new.title, new.original_title);
+END;
+CREATE TRIGGER IF NOT EXISTS movies_ad AFTER DELETE ON movies BEGIN
+    INSERT INTO movies_fts (movies_fts, rowid, title, original_title) VALUES ('delete', old.id, old.title, old.original_title);
+END;
+CREATE TRIGGER IF NOT EXISTS movies_au AFTER UPDATE OF title, original_title ON movies
+WHEN old.title IS NOT new.title OR old.original_title IS NOT new.original_title BEGIN
+    INSERT INTO movies_fts (movies_fts, rowid, title, original_title) VALUES ('delete', old.id, old.title, old.original_title);
+    INSERT INTO movies_fts (rowid, title, original_title) VALUES (new.id, new.title, new.original_title);
+END;
+"""
+
+TOKEN = re.compile(r"\w+", re.UNICODE)
+
+def open_export(source):
+    # Daily exports are gzipped JSON lines; read them as a stream so a
+    # million-line file never has to fit in memory.
+    if source.startswith(("http://", "https://")):
+        response = requests.get(source, stream=True, timeout=(5, 60))
+        response.raise_for_status()
+        raw = response.raw
+        return io.TextIOWrapper(gzip.GzipFile(fileobj=raw) if source.endswith(".gz") else raw, encoding="utf-8")
+    if source.endswith(".gz"):
+        return gzip.open(source, "rt", encoding="utf-8")
+    return open(source, encoding="utf-8")
+
+class MovieCatalog:
+    BATCH_SIZE = 5000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM movies").fetchone()[0]
+
+    def _generation(self):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    def ingest_export(self, source, prune=False):
+        conn = self._conn()
+        generation = self._generation() + 1
+        count = 0
+        batch = []
+        def flush():
+            # Keep titles, years and posters learned from the API; the export
+            # only refreshes what it actually carries.
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO movies (id, title, original_title, popularity, generation) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET original_title = excluded.original_title, "
+                "popularity = excluded.popularity, generation = excluded.generation", batch)
+            conn.execute("COMMIT")
+            batch.clear()
+        with open_export(source) as lines:
+            for line in lines:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if item.get("adult") or item.get("video"):
+                    continue
+                title = item.get("original_title") or ""
+                batch.append((item["id"], title, title, item.get("popularity") or 0, generation))
+                count += 1
+                if len(batch) >= self.BATCH_SIZE:
+                    flush()
+        if batch:
+            flush()
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)", (str(generation),))
+        removed = 0
+        if prune:
+            removed = conn.execute("DELETE FROM movies WHERE generation < ?", (generation,)).rowcount
+            conn.execute("DELETE FROM movie_genres WHERE movie_id NOT IN (SELECT id FROM movies)")
+        return count, removed
+
+    def upsert_movies(self, movies):
+        if not movies:
+            return
+        generation = self._generation()
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            self._upsert(conn, movies, generation)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _upsert(self, conn, movies, generation):
+        for movie in movies:
+            release_date = movie.get("release_date") or None
+            conn.execute(
+                "INSERT INTO movies (id, title, original_title, release_date, release_year, poster_path, popularity, generation) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET title = excluded.title, "
+                "original_title = excluded.original_title, release_date = excluded.release_date, release_year = excluded.release_year, "
+                "poster_path = excluded.poster_path, popularity = excluded.popularity",
+                (movie["id"], movie.get("title") or movie.get("original_title") or "", movie.get("original_title"),
+                 release_date, int(release_date[:4]) if release_date else None, movie.get("poster_path"),
+                 movie.get("popularity") or 0, generation))
+            conn.executemany("INSERT OR IGNORE INTO movie_genres (genre_id, movie_id) VALUES (?, ?)",
+                             [(genre_id, movie["id"]) for genre_id in movie.get("genre_ids", [])])
+
+    def poster_paths(self, limit=None):
+        # Most popular first, so a partial warm-up covers what people search.
+        sql = "SELECT poster_path FROM movies WHERE poster_path IS NOT NULL ORDER BY popularity DESC"
+        params = ()
+        if limit:
+            sql += " LIMIT ?"
+            params = (limit,)
+        return [row[0] for row in self._conn().execute(sql, params)]
+
+    def search(self, query, year=None, genre_id=None, limit=10):
+        tokens = TOKEN.findall(query or "")
+        if not tokens:
+            return []
+        sql = "SELECT m.* FROM movies_fts JOIN movies m ON m.id = movies_fts.rowid WHERE movies_fts MATCH ?"
+        params = [" ".join(f'"{token}"*' for token in tokens)]
+        if year:
+            sql += " AND m.release_year = ?"
+            params.append(int(year))
+        if genre_id:
+            sql += " AND EXISTS (SELECT 1 FROM movie_genres g WHERE g.genre_id = ? AND g.movie_id = m.id)"
+            params.append(int(genre_id))
+        sql += " ORDER BY m.popularity DESC LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self._conn().execute(sql, params)]
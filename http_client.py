@@ -0,0 +1,105 @@
+import logging, random, time
+from email.utils import parsedate_to_datetime
+import requests
+from metrics import Registry, record
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class RateLimitExceeded(requests.RequestException):
+    pass
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class UpstreamClient:
+    def __init__(self, name, base_url, default_params=None, connect_timeout=3.05, read_timeout=10,
+                 max_retries=3, backoff=0.5, max_backoff=8, max_retry_after=30, pool_size=20,
+                 scheduler=None, queue_timeout=30, metrics=None):
+        self.name = name
+        # Without a registry the series still exist, they are just never exported.
+        self.metrics = metrics if metrics is not None else Registry()
+        self._latency = self.metrics.histogram("upstream_request_seconds", "Upstream request latency per attempt (per message for SMTP).", ("upstream",))
+        self._queued = self.metrics.histogram("upstream_queue_seconds", "Time spent waiting for a rate limit token.", ("upstream",))
+        self._retries = self.metrics.counter("upstream_retries_total", "Upstream attempts that were retried.", ("upstream", "reason"))
+        self._errors = self.metrics.counter("upstream_errors_total", "Upstream requests that failed after the last attempt.", ("upstream", "reason"))
+        self.scheduler = scheduler
+        self.queue_timeout = queue_timeout
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.session = requests.Session()
+        self.session.params = dict(default_params or {})
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _delay(self, attempt, retry_after=None):
+        # Full jitter keeps concurrent workers from retrying in lockstep.
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_retry_after))
+        return delay
+
+    def _count(self, counter, reason):
+        counter.inc(self.name, reason)
+
+    def _acquire(self):
+        if self.scheduler is None:
+            return True
+        started = time.perf_counter()
+        acquired = self.scheduler.acquire(self.name, timeout=self.queue_timeout)
+        record(self._queued, self.name, time.perf_counter() - started, timing=f"{self.name}_queue")
+        return acquired
+
+    def _send(self, url, params):
+        started = time.perf_counter()
+        try:
+            return self.session.get(url, params=params, timeout=self.timeout)
+        finally:
+            record(self._latency, self.name, time.perf_counter() - started)
+
+    def get(self, path, **params):
+        url = self.base_url + path
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            if not self._acquire():
+                self._count(self._errors, "rate_limited")
+                raise RateLimitExceeded(f"{self.name} hız sınırı kuyruğunda {self.queue_timeout} sn beklendi")
+            try:
+                response = self._send(url, params)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                reason = "timeout" if isinstance(e, requests.Timeout) else "connection"
+                if last_attempt:
+                    self._count(self._errors, reason)
+                    raise
+                self._count(self._retries, reason)
+                delay = self._delay(attempt)
+                logger.warning("%s %s failed (%s), retrying in %.2fs", self.name, path, e, delay)
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    if response.status_code >= 400:
+                        self._count(self._errors, str(response.status_code))
+                    response.raise_for_status()
+                    return response
+                self._count(self._retries, str(response.status_code))
+                delay = self._delay(attempt, parse_retry_after(response.headers.get("Retry-After")))
+                logger.warning("%s %s returned %s, retrying in %.2fs", self.name, path, response.status_code, delay)
+            time.sleep(delay)
+
+    def get_json(self, path, **params):
+        return self.get(path, **params).json()
@@ -0,0 +1,130 @@
+import hashlib, io, logging, os, re, sqlite3, threading, time
+from cache import SingleFlight
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it TMDB's own sizes are stored as-is.
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# source: the TMDB size to download; box: what to resize it to when Pillow
+# is available (2x the CSS size the pages display); fallback: the TMDB size
+# to store when it is not.
+VARIANTS = {
+    "thumb": {"source": "w185", "box": (100, 150), "fallback": "w92"},
+    "detail": {"source": "w500", "box": None, "fallback": "w500"},
+}
+
+POSTER_NAME = re.compile(r"^[A-Za-z0-9_-]+\.(jpg|jpeg|png)$")
+
+class PosterCache:
+    def __init__(self, directory, client, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.client = client
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._flight = SingleFlight()
+        self._evict_lock = threading.Lock()
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        self._conn().execute("""
+            CREATE TABLE IF NOT EXISTS posters (
+                variant TEXT NOT NULL,
+                name TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mimetype TEXT NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (variant, name)
+            )""")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.directory, "index.db"), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def blob_path(self, digest):
+        return os.path.join(self.directory, "blobs", digest[:2], digest)
+
+    def _render(self, variant, name):
+        spec = VARIANTS[variant]
+        if Image is None or spec["box"] is None:
+            size = spec["source"] if spec["box"] is None else spec["fallback"]
+            response = self.client.get(f"/{size}/{name}")
+            return response.content, response.headers.get("Content-Type", "image/jpeg")
+        source = self.client.get(f"/{spec['source']}/{name}").content
+        image = Image.open(io.BytesIO(source)).convert("RGB")
+        image.thumbnail(spec["box"], Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, "JPEG", quality=82, optimize=True, progressive=True)
+        return output.getvalue(), "image/jpeg"
+
+    def _store(self, variant, name):
+        data, mimetype = self._render(variant, name)
+        # Content-addressed: identical bytes (e.g. the same poster re-uploaded
+        # under a new path) share one file, and the digest doubles as the ETag.
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        self._conn().execute("INSERT OR REPLACE INTO posters (variant, name, digest, size, mimetype, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                             (variant, name, digest, len(data), mimetype, time.time()))
+        self._evict()
+        return digest, mimetype
+
+    def get(self, variant, name):
+        if variant not in VARIANTS or not POSTER_NAME.match(name):
+            raise ValueError(f"Geçersiz poster isteği: {variant}/{name}")
+        conn = self._conn()
+        row = conn.execute("SELECT digest, mimetype FROM posters WHERE variant = ? AND name = ?", (variant, name)).fetchone()
+        if row is not None and os.path.exists(self.blob_path(row[0])):
+            conn.execute("UPDATE posters SET last_access = ? WHERE variant = ? AND name = ?", (time.time(), variant, name))
+            return self.blob_path(row[0]), row[0], row[1]
+        digest, mimetype = self._flight.do((variant, name), lambda: self._store(variant, name))
+        return self.blob_path(digest), digest, mimetype
+
+    def total_bytes(self):
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM posters)").fetchone()[0]
+
+    def _evict(self):
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            conn = self._conn()
+            total = self.total_bytes()
+            if total <= self.max_bytes:
+                return
+            # Evict least recently served entries down to 90% so we are not
+            # back here on the very next store.
+            for variant, name, digest, size in conn.execute(
+                    "SELECT variant, name, digest, size FROM posters ORDER BY last_access").fetchall():
+                if total <= self.max_bytes * 0.9:
+                    break
+                conn.execute("DELETE FROM posters WHERE variant = ? AND name = ?", (variant, name))
+                if conn.execute("SELECT 1 FROM posters WHERE digest = ? LIMIT 1", (digest,)).fetchone() is None:
+                    try:
+                        os.remove(self.blob_path(digest))
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+        finally:
+            self._evict_lock.release()
+
+    def warm(self, names, variants, pool):
+        futures = [pool.submit(self.get, variant, name.lstrip("/")) for name in names for variant in variants]
+        warmed, failed = 0, 0
+        for future in futures:
+            try:
+                future.result()
+                warmed += 1
+            except Exception as e:
+                logger.warning("Poster önbelleğe alınamadı: %s", e)
+                failed += 1
+        return warmed, failed
@@ -0,0 +1,155 @@
+import json, logging, random, sqlite3, threading, time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    idempotency_key TEXT UNIQUE,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    result TEXT,
+    run_after REAL NOT NULL,
+    locked_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after);
+"""
+
+class JobQueue:
+    def __init__(self, path, max_attempts=5, backoff=10, max_backoff=600, lease=300, poll_interval=1.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.handlers = {}
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._workers = []
+        self._start_lock = threading.Lock()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind, payload, idempotency_key=None):
+        now = time.time()
+        conn = self._conn()
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO jobs (kind, idempotency_key, payload, run_after, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, idempotency_key, json.dumps(payload, ensure_ascii=False), now, now, now))
+        if cursor.rowcount:
+            self._wakeup.set()
+            return cursor.lastrowid, True
+        row = conn.execute("SELECT id FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+        return row["id"], False
+
+    def get(self, job_id):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _claim(self):
+        now = time.time()
+        conn = self._conn()
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers (or two
+        # processes sharing the file) can never claim the same row.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND locked_until < ?) "
+                "ORDER BY run_after LIMIT 1", (now, now)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ?, updated_at = ? WHERE id = ?",
+                             (now + self.lease, now, row["id"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _renew(self, job_id):
+        self._conn().execute("UPDATE jobs SET locked_until = ? WHERE id = ? AND status = 'running'", (time.time() + self.lease, job_id))
+
+    def _keep_alive(self, job_id, stop):
+        # A handler can outlive the lease (a bulk run takes as long as its
+        # list); without renewal another worker would claim the row and run
+        # the job a second time alongside this one.
+        while not stop.wait(self.lease / 3):
+            try:
+                self._renew(job_id)
+            except sqlite3.Error as e:
+                logger.warning("İş %s kilidi yenilenemedi: %s", job_id, e)
+
+    def _finish(self, job_id, result):
+        self._conn().execute("UPDATE jobs SET status = 'done', result = ?, last_error = NULL, locked_until = NULL, updated_at = ? WHERE id = ?",
+                             (json.dumps(result, ensure_ascii=False), time.time(), job_id))
+
+    def _fail(self, job_id, attempts, error):
+        now = time.time()
+        if attempts >= self.max_attempts:
+            status, run_after = 'failed', now
+        else:
+            status = 'queued'
+            run_after = now + random.uniform(0.5, 1.0) * min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+        self._conn().execute("UPDATE jobs SET status = ?, last_error = ?, run_after = ?, locked_until = NULL, updated_at = ? WHERE id = ?",
+                             (status, error, run_after, now, job_id))
+
+    def run_pending(self):
+        row = self._claim()
+        if row is None:
+            return False
+        attempts = row["attempts"] + 1
+        handler = self.handlers.get(row["kind"])
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._keep_alive, args=(row["id"], stop), name=f"job-lease-{row['id']}", daemon=True)
+        heartbeat.start()
+        try:
+            if handler is None:
+                raise LookupError(f"Bilinmeyen iş türü: {row['kind']}")
+            result = handler(json.loads(row["payload"]))
+        except Exception as e:
+            logger.warning("İş %s başarısız (deneme %s): %s", row["id"], attempts, e)
+            self._fail(row["id"], attempts, str(e))
+        else:
+            self._finish(row["id"], result)
+        finally:
+            stop.set()
+            heartbeat.join()
+        return True
+
+    def _work(self):
+        while True:
+            try:
+                if self.run_pending():
+                    continue
+            except Exception:
+                logger.exception("İş kuyruğu hatası")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self, workers):
+        with self._start_lock:
+            while len(self._workers) < workers:
+                thread = threading.Thread(target=self._work, name=f"job-worker-{len(self._workers)}", daemon=True)
+                thread.start()
+                self._workers.append(thread)
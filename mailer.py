@@ -0,0 +1,137 @@
+import logging, smtplib, threading, time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from metrics import Registry, record
+
+logger = logging.getLogger(__name__)
+
+def build_message(sender, recipient, subject, html_content):
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = recipient
+    msg.attach(MIMEText(html_content, 'html'))
+    return msg
+
+class SMTPTransport:
+    def __init__(self, host, port, username=None, password=None, starttls=True, timeout=30,
+                 noop_after=30, max_messages_per_connection=90, max_per_minute=None, metrics=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.noop_after = noop_after
+        self.max_messages_per_connection = max_messages_per_connection
+        self.max_per_minute = max_per_minute
+        self._server = None
+        self._sent_on_connection = 0
+        self._last_used = 0.0
+        self._last_sent = 0.0
+        self._lock = threading.Lock()
+        self.metrics = metrics if metrics is not None else Registry()
+        self._latency = self.metrics.histogram("upstream_request_seconds", "Upstream request latency per attempt (per message for SMTP).", ("upstream",))
+        self._retries = self.metrics.counter("upstream_retries_total", "Upstream attempts that were retried.", ("upstream", "reason"))
+        self._errors = self.metrics.counter("upstream_errors_total", "Upstream requests that failed after the last attempt.", ("upstream", "reason"))
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self._sent_on_connection = 0
+        self._last_used = time.monotonic()
+
+    def _disconnect(self):
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def _ensure_connection(self):
+        if self._server is not None and self._sent_on_connection >= self.max_messages_per_connection:
+            self._disconnect()
+        # Servers drop idle sessions without telling us; probe before reusing an old one.
+        if self._server is not None and time.monotonic() - self._last_used > self.noop_after:
+            try:
+                if self._server.noop()[0] != 250:
+                    self._disconnect()
+            except (smtplib.SMTPException, OSError):
+                self._disconnect()
+        if self._server is None:
+            self._connect()
+
+    def _count(self, counter, reason):
+        counter.inc("smtp", reason)
+
+    def _throttle(self):
+        if not self.max_per_minute:
+            return
+        wait = self._last_sent + 60.0 / self.max_per_minute - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+    def _send(self, msg):
+        self._throttle()
+        started = time.perf_counter()
+        try:
+            self._deliver(msg)
+        except (smtplib.SMTPException, OSError) as e:
+            self._count(self._errors, type(e).__name__)
+            raise
+        finally:
+            record(self._latency, "smtp", time.perf_counter() - started)
+
+    def _deliver(self, msg):
+        for attempt in range(2):
+            self._ensure_connection()
+            try:
+                self._server.send_message(msg)
+                break
+            except smtplib.SMTPServerDisconnected as e:
+                error = e
+            except smtplib.SMTPException:
+                # The server answered (a 550, a refused recipient): smtplib has
+                # already sent RSET, so the session stays usable and resending
+                # would only repeat the refusal after another login.
+                self._last_used = time.monotonic()
+                raise
+            except OSError as e:
+                error = e
+            # A session that died mid-conversation gets one fresh reconnect.
+            self._disconnect()
+            if attempt:
+                raise error
+            self._count(self._retries, "disconnected")
+            logger.warning("SMTP oturumu koptu, yeniden bağlanılıyor: %s", error)
+        self._sent_on_connection += 1
+        self._last_used = self._last_sent = time.monotonic()
+
+    def send(self, msg):
+        with self._lock:
+            self._send(msg)
+
+    def send_batch(self, messages):
+        failures = []
+        with self._lock:
+            for index, msg in enumerate(messages):
+                try:
+                    self._send(msg)
+                except (smtplib.SMTPException, OSError) as e:
+                    logger.warning("Gönderi %s iletilemedi: %s", msg['Subject'], e)
+                    failures.append((index, e))
+        return failures
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
@@ -0,0 +1,190 @@
+import bisect, functools, threading, time
+from contextlib import contextmanager
+
+# Seconds. Spans a cache hit (sub-millisecond) through a slow TMDB page or SMTP login.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_context = threading.local()
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (last one is +Inf), sum]. Counts
+        # are stored non-cumulative so observe() touches a single slot.
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self):
+        with self._lock:
+            snapshot = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+class Gauge:
+    def __init__(self, name, help, labelnames, read, kind="gauge"):
+        # Sampled at scrape time, so values that already live elsewhere (cache
+        # counters, queue depth) are not double-booked on the hot path. Pass
+        # kind="counter" when the source only ever grows.
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.read = read
+
+    def collect(self):
+        for labels, value in sorted(self.read().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+class Registry:
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        # Get-or-create, so every UpstreamClient can ask for the same series.
+        name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help, labelnames, buckets)
+
+    def gauge(self, name, help, labelnames, read, kind="gauge"):
+        return self._register(Gauge, name, help, labelnames, read, kind)
+
+    def render(self):
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            total, count = self._entries.get(name, (0.0, 0))
+            self._entries[name] = (total + seconds, count + 1)
+
+    def server_timing(self):
+        # Durations of calls that ran in parallel are summed per name, so the
+        # parts can add up to more than "total".
+        with self._lock:
+            entries = sorted(self._entries.items())
+        parts = [f'{name};dur={total * 1000:.1f};desc="{count}x"' for name, (total, count) in entries]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+def current_timings():
+    return getattr(_context, "timings", None)
+
+def bind(timings):
+    _context.timings = timings
+
+@contextmanager
+def collecting(timings):
+    previous = current_timings()
+    _context.timings = timings
+    try:
+        yield timings
+    finally:
+        _context.timings = previous
+
+def with_timings(func):
+    # Like ratelimit.with_priority: pool threads do not inherit the request's
+    # thread-local, so capture it at submit time.
+    timings = current_timings()
+    if timings is None:
+        return func
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with collecting(timings):
+            return func(*args, **kwargs)
+    return wrapper
+
+def record(histogram, name, seconds, timing=None):
+    histogram.observe(seconds, name)
+    timings = current_timings()
+    if timings is not None:
+        timings.add(timing or name, seconds)
+
+@contextmanager
+def timer(histogram, name, errors=None):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if errors is not None:
+            errors.inc(name)
+        raise
+    finally:
+        record(histogram, name, time.perf_counter() - started)
+
+def timed(histogram, name=None, errors=None):
+    def decorator(func):
+        label = name or func.__name__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(histogram, label, errors):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
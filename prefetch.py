@@ -0,0 +1,85 @@
+import logging, queue, threading, time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class Prefetcher:
+    MAX_OWNERS = 1024
+
+    def __init__(self, fetch, is_warm=None, max_queue=32, max_per_second=None):
+        self.fetch = fetch
+        self.is_warm = is_warm or (lambda movie_id: False)
+        self.max_per_second = max_per_second
+        self._queue = queue.Queue(max_queue)
+        self._generations = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._workers = []
+        self.stats = {"scheduled": 0, "fetched": 0, "warm": 0, "cancelled": 0, "dropped": 0, "failed": 0}
+
+    def _count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def schedule(self, owner, movie_ids):
+        # Each new search from the same owner bumps its generation, which
+        # turns everything still queued for the previous search into a no-op.
+        with self._lock:
+            generation = self._generations.pop(owner, 0) + 1
+            self._generations[owner] = generation
+            while len(self._generations) > self.MAX_OWNERS:
+                self._generations.popitem(last=False)
+        for movie_id in movie_ids:
+            try:
+                self._queue.put_nowait((owner, generation, movie_id))
+            except queue.Full:
+                self._count("dropped")
+            else:
+                self._count("scheduled")
+
+    def cancel(self, owner):
+        with self._lock:
+            if owner in self._generations:
+                self._generations[owner] += 1
+
+    def _current(self, owner, generation):
+        with self._lock:
+            return self._generations.get(owner) == generation
+
+    def _pace(self):
+        if not self.max_per_second:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.max_per_second
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _work(self):
+        while True:
+            owner, generation, movie_id = self._queue.get()
+            if not self._current(owner, generation):
+                self._count("cancelled")
+                continue
+            if self.is_warm(movie_id):
+                self._count("warm")
+                continue
+            self._pace()
+            if not self._current(owner, generation):
+                self._count("cancelled")
+                continue
+            try:
+                self.fetch(movie_id)
+            except Exception as e:
+                logger.debug("Ön yükleme başarısız (%s): %s", movie_id, e)
+                self._count("failed")
+            else:
+                self._count("fetched")
+
+    def start(self, workers):
+        with self._lock:
+            while len(self._workers) < workers:
+                thread = threading.Thread(target=self._work, name=f"prefetch-{len(self._workers)}", daemon=True)
+                thread.start()
+                self._workers.append(thread)
@@ -0,0 +1,136 @@
+import datetime, functools, heapq, itertools, sqlite3, threading, time
+from contextlib import contextmanager
+
+PRIORITIES = {"interactive": 0, "batch": 1, "prefetch": 2}
+
+_context = threading.local()
+
+def current_priority():
+    return getattr(_context, "priority", "interactive")
+
+@contextmanager
+def priority(name):
+    previous = current_priority()
+    _context.priority = name
+    try:
+        yield
+    finally:
+        _context.priority = previous
+
+def with_priority(func, name=None):
+    # Thread-locals do not follow work onto a pool, so capture the caller's
+    # priority now and re-apply it in whichever thread runs func.
+    name = name or current_priority()
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with priority(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, rank=0, timeout=None):
+        # Waiters are served strictly by (rank, arrival), so an interactive
+        # page load jumps ahead of queued batch and prefetch requests.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            entry = (rank, next(self._seq))
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    self._refill()
+                    head = self._waiters[0] == entry
+                    if head and self.tokens >= 1:
+                        self.tokens -= 1
+                        return True
+                    wait = (1 - self.tokens) / self.rate if head else None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def status(self):
+        with self._cond:
+            self._refill()
+            return {"rate": self.rate, "burst": self.capacity, "tokens": round(self.tokens, 2), "waiting": len(self._waiters)}
+
+class DailyQuota:
+    def __init__(self, path, name, limit, reserve=0):
+        self.path = path
+        self.name = name
+        self.limit = limit
+        self.reserve = reserve
+        self._local = threading.local()
+        self._conn().execute("CREATE TABLE IF NOT EXISTS quota (name TEXT NOT NULL, day TEXT NOT NULL, used INTEGER NOT NULL, PRIMARY KEY (name, day))")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _today():
+        # OMDb's daily limit resets at midnight UTC.
+        return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+    def used(self):
+        row = self._conn().execute("SELECT used FROM quota WHERE name = ? AND day = ?", (self.name, self._today())).fetchone()
+        return row[0] if row else 0
+
+    def remaining(self):
+        return max(0, self.limit - self.used())
+
+    def try_consume(self, priority_name="interactive"):
+        # Only interactive requests may dip into the reserve; everything else
+        # degrades once the budget is down to it.
+        ceiling = self.limit if priority_name == "interactive" else self.limit - self.reserve
+        conn, today = self._conn(), self._today()
+        conn.execute("INSERT OR IGNORE INTO quota (name, day, used) VALUES (?, ?, 0)", (self.name, today))
+        cursor = conn.execute("UPDATE quota SET used = used + 1 WHERE name = ? AND day = ? AND used < ?", (self.name, today, ceiling))
+        return cursor.rowcount == 1
+
+    def exhaust(self):
+        self._conn().execute("INSERT OR REPLACE INTO quota (name, day, used) VALUES (?, ?, ?)", (self.name, self._today(), self.limit))
+
+    def status(self):
+        used = self.used()
+        return {"limit": self.limit, "used": used, "remaining": max(0, self.limit - used), "reserve": self.reserve,
+                "degraded": self.limit - used <= self.reserve}
+
+class UpstreamScheduler:
+    def __init__(self):
+        self.buckets = {}
+
+    def add_bucket(self, name, rate, burst):
+        self.buckets[name] = TokenBucket(rate, burst)
+
+    def acquire(self, name, timeout=None):
+        bucket = self.buckets.get(name)
+        if bucket is None:
+            return True
+        return bucket.acquire(PRIORITIES.get(current_priority(), 0), timeout)
+
+    def status(self):
+        return {name: bucket.status() for name, bucket in self.buckets.items()}
@@ -0,0 +1,173 @@
+import collections, json, os, random, re, socketserver, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+class Faults:
+    """Latency and error injection shared by every stub."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def apply(self):
+        # Returns True when this call should fail.
+        with self._lock:
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            failed = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        return failed
+
+class Stub:
+    def __init__(self, name, faults=None):
+        self.name = name
+        self.faults = faults or Faults()
+        self.calls = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _count(self, failed):
+        with self._lock:
+            self.calls += 1
+            self.errors += failed
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._server = self._make_server()
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name=f"stub-{self.name}", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+class HTTPStub(Stub):
+    def __init__(self, name, faults=None):
+        super().__init__(name, faults)
+        self.url = None
+
+    def route(self, path, query):
+        raise NotImplementedError
+
+    def _make_server(self):
+        stub = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                failed = stub.faults.apply()
+                stub._count(failed)
+                if failed:
+                    status, body = 503, {"status_code": 503, "status_message": "Injected failure"}
+                else:
+                    url = urlsplit(self.path)
+                    status, body = stub.route(url.path, {key: values[0] for key, values in parse_qs(url.query).items()})
+                data = json.dumps(body, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 503:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{server.server_address[1]}"
+        return server
+
+class TMDBStub(HTTPStub):
+    NOT_FOUND = (404, {"status_code": 34, "status_message": "The resource you requested could not be found."})
+
+    def __init__(self, faults=None, fixture="bench_tmdb.json"):
+        super().__init__("tmdb", faults)
+        self.data = load_fixture(fixture)
+
+    def route(self, path, query):
+        if path == "/3/genre/movie/list":
+            return 200, self.data["genres"]
+        if path in ("/3/search/movie", "/3/discover/movie"):
+            return 200, self.data["search"]
+        match = re.fullmatch(r"/3/movie/(\d+)(/[\w/]+)?", path)
+        if not match or match.group(1) not in self.data["movies"]:
+            return self.NOT_FOUND
+        movie = self.data["movies"][match.group(1)]
+        if match.group(2):
+            part = match.group(2)[1:]
+            return (200, movie[part]) if part in movie else self.NOT_FOUND
+        # Like TMDB, only the parts named in append_to_response are embedded.
+        parts = set(query.get("append_to_response", "").split(","))
+        return 200, {key: value for key, value in movie.items() if key not in ("credits", "videos", "keywords", "watch/providers") or key in parts}
+
+class OMDbStub(HTTPStub):
+    def __init__(self, faults=None, fixture="bench_omdb.json"):
+        super().__init__("omdb", faults)
+        self.data = load_fixture(fixture)
+
+    def route(self, path, query):
+        movie = self.data.get(query.get("i", ""))
+        if movie is None:
+            return 200, {"Response": "False", "Error": "Incorrect IMDb ID."}
+        return 200, movie
+
+class SMTPStub(Stub):
+    """Accepts and discards mail; just enough SMTP for smtplib without STARTTLS."""
+
+    def __init__(self, faults=None):
+        super().__init__("smtp", faults)
+        self.messages = 0
+        self.connections = 0
+        self.commands = collections.Counter()
+
+    def _make_server(self):
+        stub = self
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode() + b"\r\n")
+
+            def handle(self):
+                with stub._lock:
+                    stub.connections += 1
+                self.reply("220 stub ESMTP")
+                for raw in self.rfile:
+                    command = raw.decode("utf-8", "replace").strip().split(" ", 1)[0].upper()
+                    with stub._lock:
+                        stub.commands[command] += 1
+                    if command in ("EHLO", "HELO"):
+                        self.reply("250 stub")
+                    elif command in ("MAIL", "RCPT", "RSET", "NOOP"):
+                        self.reply("250 OK")
+                    elif command == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        for line in self.rfile:
+                            if line in (b".\r\n", b".\n"):
+                                break
+                        failed = stub.faults.apply()
+                        stub._count(failed)
+                        if failed:
+                            self.reply("451 4.3.0 Injected failure")
+                        else:
+                            with stub._lock:
+                                stub.messages += 1
+                            self.reply("250 OK queued")
+                    elif command == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Command not implemented")
+        return socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
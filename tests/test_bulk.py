@@ -0,0 +1,82 @@
+import threading, time
+import pytest
+from bulk import BulkLedger, RunInProgress, run_bulk
+from jobs import JobQueue
+
+def wait_for(queue, job_id, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def recording_sender(sent, fail_ids=()):
+    lock = threading.Lock()
+    def send_batch(posts):
+        failures = []
+        for index, (subject, _) in enumerate(posts):
+            if int(subject) in fail_ids:
+                failures.append((index, OSError("boom")))
+            else:
+                with lock:
+                    sent.append(int(subject))
+        return failures
+    return send_batch
+
+def test_job_outliving_its_lease_runs_once(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), lease=1, poll_interval=0.05)
+    runs = []
+    def slow(payload):
+        runs.append(threading.current_thread().name)
+        time.sleep(3)
+        return {"ok": True}
+    queue.register("slow", slow)
+    queue.start(2)
+    job_id, _ = queue.enqueue("slow", {})
+    job = wait_for(queue, job_id)
+    assert job["status"] == "done"
+    assert len(runs) == 1
+    assert job["attempts"] == 1
+
+def test_bulk_job_longer_than_lease_sends_each_post_once(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    queue, ledger = JobQueue(path, lease=1, poll_interval=0.05), BulkLedger(path)
+    sent = []
+    def fetch(movie_id):
+        time.sleep(0.5)
+        return movie_id
+    queue.register("bulk", lambda payload: run_bulk(payload["run_id"], payload["movie_ids"], fetch,
+                                                    lambda movie_id, data: (str(data), "<p></p>"),
+                                                    recording_sender(sent), ledger, lease=1,
+                                                    fetch_workers=1, batch_size=1).as_dict())
+    queue.start(2)
+    job_id, _ = queue.enqueue("bulk", {"run_id": "long", "movie_ids": list(range(1, 7))})
+    job = wait_for(queue, job_id)
+    assert job["status"] == "done"
+    assert sorted(sent) == list(range(1, 7))
+
+def test_run_bulk_refuses_a_run_id_held_by_a_live_run(tmp_path):
+    ledger = BulkLedger(str(tmp_path / "jobs.db"))
+    assert ledger.acquire("busy", "other-process", lease=60)
+    with pytest.raises(RunInProgress):
+        run_bulk("busy", [1], lambda movie_id: movie_id, lambda movie_id, data: (str(data), ""), recording_sender([]), ledger)
+
+def test_run_bulk_takes_over_an_expired_run(tmp_path):
+    ledger = BulkLedger(str(tmp_path / "jobs.db"))
+    assert ledger.acquire("stale", "crashed-process", lease=-1)
+    sent = []
+    report = run_bulk("stale", [1, 2], lambda movie_id: movie_id, lambda movie_id, data: (str(data), ""), recording_sender(sent), ledger)
+    assert report.sent == 2
+    assert ledger.acquire("stale", "next-run", lease=60)
+
+def test_resume_only_sends_what_is_missing(tmp_path):
+    ledger = BulkLedger(str(tmp_path / "jobs.db"))
+    render = lambda movie_id, data: (str(data), "")
+    first, second = [], []
+    report = run_bulk("resume", [1, 2, 3], lambda movie_id: movie_id, render, recording_sender(first, fail_ids={2}), ledger)
+    assert (report.sent, len(report.failures)) == (2, 1)
+    report = run_bulk("resume", [1, 2, 3], lambda movie_id: movie_id, render, recording_sender(second), ledger)
+    assert second == [2]
+    assert (report.sent, report.skipped) == (1, 2)
@@ -0,0 +1,15 @@
+from cache import ResponseCache
+
+def test_default_and_explicit_arguments_share_an_entry():
+    cache, calls = ResponseCache(maxsize=16), []
+    @cache.cached("bundle", ttl=60)
+    def fetch(movie_id, language='tr-TR'):
+        calls.append((movie_id, language))
+        return {"id": movie_id}
+    fetch(550)
+    fetch(550, 'tr-TR')
+    fetch(movie_id=550, language='tr-TR')
+    assert calls == [(550, 'tr-TR')]
+    assert fetch.is_cached(550, language='tr-TR')
+    fetch(550, 'en-US')
+    assert len(calls) == 2
@@ -0,0 +1,30 @@
+import pytest, requests
+from http_client import UpstreamClient
+from metrics import Registry
+from stubs import Faults, TMDBStub
+
+@pytest.fixture
+def failing_tmdb():
+    stub = TMDBStub(Faults(error_rate=1.0)).start()
+    yield stub
+    stub.stop()
+
+def test_client_without_metrics_retries_connection_errors():
+    client = UpstreamClient("x", "http://127.0.0.1:1", max_retries=2, backoff=0)
+    with pytest.raises(requests.ConnectionError):
+        client.get("/")
+
+def test_client_without_metrics_retries_5xx(failing_tmdb):
+    client = UpstreamClient("tmdb", failing_tmdb.url + "/3", max_retries=2, backoff=0)
+    with pytest.raises(requests.HTTPError):
+        client.get("/genre/movie/list")
+    assert failing_tmdb.calls == 3
+
+def test_retries_and_errors_are_counted(failing_tmdb):
+    registry = Registry()
+    client = UpstreamClient("tmdb", failing_tmdb.url + "/3", max_retries=1, backoff=0, metrics=registry)
+    with pytest.raises(requests.HTTPError):
+        client.get("/genre/movie/list")
+    rendered = registry.render()
+    assert 'upstream_retries_total{upstream="tmdb",reason="503"} 1' in rendered
+    assert 'upstream_errors_total{upstream="tmdb",reason="503"} 1' in rendered
@@ -0,0 +1,42 @@
+import socket, smtplib
+import pytest
+from mailer import SMTPTransport, build_message
+from stubs import Faults, SMTPStub
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def messages(count):
+    return [build_message("a@example.com", "b@example.com", f"Film {n}", "<p></p>") for n in range(count)]
+
+@pytest.fixture
+def smtp_stub(request):
+    stub = SMTPStub(Faults(error_rate=getattr(request, "param", 0.0))).start()
+    yield stub
+    stub.stop()
+
+def test_send_batch_reuses_one_session(smtp_stub):
+    transport = SMTPTransport("127.0.0.1", smtp_stub.port, starttls=False)
+    assert transport.send_batch(messages(3)) == []
+    transport.close()
+    assert smtp_stub.messages == 3
+    assert smtp_stub.connections == 1
+
+@pytest.mark.parametrize("smtp_stub", [1.0], indirect=True)
+def test_refused_messages_keep_the_session(smtp_stub):
+    transport = SMTPTransport("127.0.0.1", smtp_stub.port, starttls=False)
+    failures = transport.send_batch(messages(3))
+    transport.close()
+    assert [index for index, _ in failures] == [0, 1, 2]
+    assert all(isinstance(error, smtplib.SMTPResponseException) for _, error in failures)
+    assert smtp_stub.connections == 1
+    assert smtp_stub.commands["DATA"] == 3
+    assert smtp_stub.commands["RSET"] == 3
+
+def test_send_batch_without_metrics_reports_connection_failures():
+    transport = SMTPTransport("127.0.0.1", unused_port(), starttls=False, timeout=2)
+    failures = transport.send_batch(messages(2))
+    assert [index for index, _ in failures] == [0, 1]
+    assert all(isinstance(error, OSError) for _, error in failures)